@@ -1,11 +1,22 @@
 import shutil
+import copy
+import time
 from docx import Document
+from docx.oxml.ns import qn
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
 import openpyxl
+import numpy as np
 import pandas as pd
 from num2words import num2words
 import re
+import math
+from collections import Counter
+import unicodedata
 import os
 import sys
+import contextlib
+import argparse
+import json
 #import win32com.client
 #import win32com.client as win32
 
@@ -14,6 +25,10 @@ script_directory = os.path.dirname(os.path.abspath(__file__))
 working_folder = os.path.abspath(os.path.join(script_directory, '..'))
 function_library = os.path.abspath(os.path.join(script_directory, 'Library'))
 sys.path.append(function_library)  # Add the library folder to the path.
+from logging_setup import get_logger, add_logging_arguments, configure_from_args
+from xlsx_patch import write_cells
+
+log = get_logger('cartas')
 
 
 #cache_dir = os.path.join(os.environ['LOCALAPPDATA'], 'Temp', 'gen_py')
@@ -29,36 +44,129 @@ def normalize_header(header):
     return re.sub(r'[^\w\sÁÉÍÓÚáéíóúÑñ#%()\-.]', '', header).strip()
 
 
-def populate_table(word_document, df_source, table_number, table_headers_row, table_headers, table_types, table_total, table_df_mapping, table_total_headers):
+# Formateo de columnas: cada formatter convierte una columna completa (pd.Series)
+_THOUSANDS_PATTERN = r"\B(?=(\d{3})+(?!\d))"
+
+
+def _as_text(series):
+    """str(value).strip() for every value, "" for nulls."""
+    return series.astype(object).astype(str).str.strip().where(series.notna(), "")
+
+
+def _format_numeric_series(series, column_type, integer_detection, prefix=""):
+    formatted = _as_text(series)
+    cleaned = series.astype(object).astype(str).str.replace(r"[^\d.]", "", regex=True)  # Remove non-numeric characters
+    numeric = pd.to_numeric(cleaned, errors='coerce').astype(float)
+    valid = numeric.notna() & series.notna()
+
+    invalid = series.notna() & ~valid
+    if invalid.any():
+        log.error("Column: %s, %s value(s) are not a valid %s, kept as text: %s", series.name, invalid.sum(), column_type, series[invalid].head(3).tolist())
+    if not valid.any():
+        return formatted
+
+    values = numeric[valid].to_numpy()
+    if integer_detection:
+        is_integer = values == np.floor(values)
+        text = np.where(is_integer, np.char.mod('%.0f', values), np.char.mod('%.2f', values))
+    else:
+        text = np.char.mod('%.2f', values)
+    text = pd.Series(text, index=series.index[valid], dtype=object).str.replace(_THOUSANDS_PATTERN, ",", regex=True)
+
+    formatted[valid] = prefix + text
+    return formatted
+
+
+def format_currency_series(series):
+    """$1,234.50 for every parsable value."""
+    return _format_numeric_series(series, 'currency', integer_detection=False, prefix="$")
+
+
+def format_number_series(series):
+    """1,234 for integers and 1,234.50 for everything else."""
+    return _format_numeric_series(series, 'number', integer_detection=True)
+
+
+def format_string_series(series):
+    return _as_text(series)
+
+
+COLUMN_FORMATTERS = {
+    'currency': format_currency_series,
+    'number': format_number_series,
+    'string': format_string_series,
+}
+
+
+def format_column(series, column_type):
+    """Formats a whole column with the formatter registered for its table_types value."""
+    formatter = COLUMN_FORMATTERS.get(column_type, format_string_series)
+    return formatter(series)
+
+
+def append_rows_bulk(table, rows, column_count):
+    """
+    Appends already formatted rows to a Word table in a single operation. One row is
+    built with python-docx as a template and its XML is cloned for every data row.
+    """
+    if not rows:
+        return
+
+    template = table.add_row()
+    template_cells = template.cells
+    if column_count > len(template_cells):
+        raise IndexError(f"Table has {len(template_cells)} columns but {column_count} values were mapped.")
+    for cell in template_cells[:column_count]:
+        cell.text = "x"
+    template_tr = template._tr
+    table._tbl.remove(template_tr)
+
+    new_rows = []
+    for values in rows:
+        tr = copy.deepcopy(template_tr)
+        for t, text in zip(list(tr.iter(qn('w:t'))), values):
+            if not text:
+                t.getparent().remove(t)
+            elif '\t' in text or '\n' in text or '\r' in text:
+                t.getparent().text = text  # Let python-docx create the tabs and breaks
+            else:
+                t.text = text
+                if len(text.strip()) < len(text):
+                    t.set(qn('xml:space'), 'preserve')
+        new_rows.append(tr)
+
+    table._tbl.extend(new_rows)
+
+
+NUMERIC_COLUMNS = ['Precio Unitario', 'Importe total Máximo', 'Cantidad Máxima']
+
+
+def coerce_numeric_columns(df_source, numeric_columns=NUMERIC_COLUMNS):
+    """Converts the numeric columns of the source DataFrame in place (invalid values become NaN)."""
+    for column in numeric_columns:
+        if column in df_source.columns:
+            df_source[column] = pd.to_numeric(df_source[column], errors='coerce')
+    return df_source
+
+
+def validate_table(table, df_source, table_number, table_headers_row, table_headers, table_types, table_df_mapping):
+    """Checks the Word headers of the table and the DataFrame columns before anything is written."""
     # Validate table_types mapping
     for col in table_df_mapping:
         if col not in table_types:
-            print(f"[ERROR] Column {col} is missing in table_types!")
+            log.error("Column %s is missing in table_types!", col)
         else:
-            print(f"[DEBUG] Column: {col}, Type: {table_types[col]}")
-    df_source['Precio Unitario'] = pd.to_numeric(df_source['Precio Unitario'], errors='coerce')
-    df_source['Importe total Máximo'] = pd.to_numeric(df_source['Importe total Máximo'], errors='coerce')
-    df_source['Cantidad Máxima'] = pd.to_numeric(df_source['Cantidad Máxima'], errors='coerce')
-    
-    # Use the passed-in document
-    doc = word_document
-
-    # Check if the table exists
-    if table_number > len(doc.tables) or table_number < 1:
-        raise ValueError(f"Table number {table_number} does not exist in the Word file.")
-    
-    # Get the specified table
-    table = doc.tables[table_number - 1]
+            log.debug("Column: %s, Type: %s", col, table_types[col])
 
     # Normalize and validate headers
     raw_word_headers = [cell.text for cell in table.rows[table_headers_row - 1].cells]
     normalized_word_headers = [normalize_header(header) for header in raw_word_headers]
 
     # Debugging to identify which table is problematic
-    print(f"[DEBUG] Table Number: {table_number}")
-    print(f"[DEBUG] Raw Word Headers: {raw_word_headers}")
-    print(f"[DEBUG] Normalized Word Headers: {normalized_word_headers}")
-    print(f"[DEBUG] Expected Headers: {table_headers}")
+    log.debug("Table Number: %s", table_number)
+    log.debug("Raw Word Headers: %s", raw_word_headers)
+    log.debug("Normalized Word Headers: %s", normalized_word_headers)
+    log.debug("Expected Headers: %s", table_headers)
 
     missing_headers = [header for header in table_headers if header not in normalized_word_headers]
     if missing_headers:
@@ -69,11 +177,282 @@ def populate_table(word_document, df_source, table_number, table_headers_row, ta
     if missing_columns:
         raise ValueError(f"Missing columns in DataFrame: {missing_columns}")
 
+
+def fill_table(table, df_source, table_headers_row, table_headers, table_types, table_total, table_df_mapping, table_total_headers, bulk=True):
+    """
+    Replaces the rows below the header with the DataFrame rows. Returns the totals
+    {header: value} of the table so the caller can substitute the {HEADER} placeholders.
+    """
     # Remove all rows after the header row
     for _ in range(len(table.rows) - table_headers_row):
         table._element.remove(table.rows[table_headers_row]._element)
 
-    # Apply type transformations
+    # Apply type transformations, one column at a time
+    formatted_columns = [format_column(df_source[column], table_types.get(column)).tolist() for column in table_df_mapping]
+    formatted_rows = list(zip(*formatted_columns))
+
+    # Populate the table
+    if bulk:
+        append_rows_bulk(table, formatted_rows, len(table_df_mapping))
+    else:
+        for values in formatted_rows:
+            new_row = table.add_row().cells
+            for col_index, transformed_value in enumerate(values):
+                new_row[col_index].text = transformed_value
+
+    totals = {}
+    if table_total:
+        for total_header in table_total_headers:
+            if total_header not in table_headers:
+                raise ValueError(f"Total header '{total_header}' is not in Word table headers.")
+            header_index = table_headers.index(total_header)
+            df_col = table_df_mapping[header_index]
+            totals[total_header] = df_source[df_col].sum()
+
+        # Add rows for Subtotal, IVA, and Total
+        for label in ["SUBTOTAL", "IVA", "GRAN TOTAL"]:
+            row_cells = table.add_row().cells
+            row_cells[0].text = label
+            for total_header, total_value in totals.items():
+                col_index = table_headers.index(total_header)
+                if label == "IVA":
+                    row_cells[col_index].text = "0.00"
+                else:
+                    row_cells[col_index].text = f"${total_value:,.2f}"
+
+    return totals
+
+
+def format_total_in_words(total_value):
+    """$1 234.50 (Mil doscientos treinta y cuatro pesos 50/100)"""
+    words = num2words(int(total_value), lang='es').capitalize()
+    cents = int(round((total_value - int(total_value)) * 100))
+    formatted_value = f"{total_value:,.2f}".replace(",", " ")
+    return f"${formatted_value} ({words} pesos {cents:02}/100)"
+
+
+# Índice de marcadores {HEADER}
+_PLACEHOLDER_PATTERN = re.compile(r"\{([^{}]+)\}")
+_PARAGRAPH_TEXT_XPATH = './w:r/w:t | ./w:hyperlink/w:r/w:t | ./w:ins/w:r/w:t | ./w:smartTag/w:r/w:t'
+
+
+def _iter_document_paragraphs(doc):
+    """Every <w:p> of the body (table cells included), headers and footers."""
+    yield from doc.element.body.iter(qn('w:p'))
+    for rel in doc.part.rels.values():
+        if rel.reltype in (RT.HEADER, RT.FOOTER) and not rel.is_external:
+            yield from rel.target_part.element.iter(qn('w:p'))
+
+
+def _paragraph_text_nodes(paragraph_element):
+    return paragraph_element.xpath(_PARAGRAPH_TEXT_XPATH)
+
+
+def build_placeholder_index(doc):
+    """
+    Scans the document once and maps every {TOKEN} to the paragraphs whose runs contain it,
+    including tokens split across several runs. Build it before filling the tables so the
+    data rows are not scanned, and reuse it for every table of the run.
+    """
+    index = {}
+    for paragraph_element in _iter_document_paragraphs(doc):
+        text = "".join(t.text or "" for t in _paragraph_text_nodes(paragraph_element))
+        if '{' not in text:
+            continue
+        for match in _PLACEHOLDER_PATTERN.finditer(text):
+            paragraphs = index.setdefault(match.group(1), [])
+            if paragraph_element not in paragraphs:
+                paragraphs.append(paragraph_element)
+    return index
+
+
+def _replace_in_paragraph(paragraph_element, placeholder, replacement):
+    """
+    Replaces the placeholder in the <w:t> nodes of one paragraph. The replacement goes in
+    the run where the placeholder starts, so its formatting is kept; the remaining pieces
+    of the placeholder are cut from the following runs.
+    """
+    replaced = 0
+    search_from = 0
+    while True:
+        text_nodes = _paragraph_text_nodes(paragraph_element)
+        texts = [t.text or "" for t in text_nodes]
+        start = "".join(texts).find(placeholder, search_from)
+        if start < 0:
+            return replaced
+        end = start + len(placeholder)
+
+        offset = 0
+        first = True
+        for t, text in zip(text_nodes, texts):
+            node_start, node_end = offset, offset + len(text)
+            offset = node_end
+            if node_end <= start or node_start >= end:
+                continue
+            local_start = max(start, node_start) - node_start
+            local_end = min(end, node_end) - node_start
+            new_text = text[:local_start] + (replacement if first else "") + text[local_end:]
+            first = False
+            t.text = new_text
+            if len(new_text.strip()) < len(new_text):
+                t.set(qn('xml:space'), 'preserve')
+
+        replaced += 1
+        search_from = start + len(replacement)
+
+
+def replace_placeholders(placeholder_index, replacements):
+    """
+    Replaces {TOKEN} with replacements[TOKEN] in the indexed paragraphs. Returns the number
+    of replacements; the replaced tokens are dropped from the index.
+    """
+    replaced = 0
+    for token, replacement in replacements.items():
+        paragraphs = placeholder_index.pop(token, [])
+        if not paragraphs:
+            log.debug("Placeholder {%s} not found in the document.", token)
+        for paragraph_element in paragraphs:
+            replaced += _replace_in_paragraph(paragraph_element, f"{{{token}}}", replacement)
+    return replaced
+
+
+def replace_total_placeholders(doc, totals, placeholder_index=None):
+    """Replaces every {HEADER} placeholder of `totals` using the placeholder index."""
+    if not totals:
+        return
+    if placeholder_index is None:
+        placeholder_index = build_placeholder_index(doc)
+    replacements = {total_header: format_total_in_words(total_value) for total_header, total_value in totals.items()}
+    replace_placeholders(placeholder_index, replacements)
+
+
+def populate_table(word_document, df_source, table_number, table_headers_row, table_headers, table_types, table_total, table_df_mapping, table_total_headers, bulk=True, placeholder_index=None):
+    coerce_numeric_columns(df_source)
+
+    # Use the passed-in document
+    doc = word_document
+
+    # Check if the table exists
+    if table_number > len(doc.tables) or table_number < 1:
+        raise ValueError(f"Table number {table_number} does not exist in the Word file.")
+    
+    # Get the specified table
+    table = doc.tables[table_number - 1]
+
+    validate_table(table, df_source, table_number, table_headers_row, table_headers, table_types, table_df_mapping)
+    if table_total and placeholder_index is None:
+        placeholder_index = build_placeholder_index(doc)
+    totals = fill_table(table, df_source, table_headers_row, table_headers, table_types, table_total, table_df_mapping, table_total_headers, bulk=bulk)
+    replace_total_placeholders(doc, totals, placeholder_index)
+
+    return doc
+
+
+# Especificación declarativa de tablas
+TABLE_SPEC_FILENAME = 'Cartas tablas.json'
+TABLE_SPEC_KEYS = ['name', 'table_number', 'headers_row', 'headers', 'types', 'df_mapping', 'total', 'total_headers']
+
+
+def default_table_spec_path():
+    """The spec next to Cartas.docx wins over the one shipped with the scripts."""
+    tender_spec = os.path.join(working_folder, TABLE_SPEC_FILENAME)
+    if os.path.exists(tender_spec):
+        return tender_spec
+    return os.path.join(script_directory, TABLE_SPEC_FILENAME)
+
+
+def load_table_specs(spec_path):
+    """
+    Loads the JSON table spec. Top level keys: 'sheet', 'sort_by', 'numeric_columns' and
+    'tables', a list with one entry per Word table using the populate_table arguments:
+
+        {"name": "Normas", "table_number": 7, "headers_row": 1, "headers": [...],
+         "types": {...}, "df_mapping": [...], "total": false, "total_headers": [],
+         "filter": {"Membrete": "Rafarm"}}
+
+    'filter' is optional and keeps only the rows whose column equals the value (or one of
+    the values when a list is given).
+    """
+    with open(spec_path, 'r', encoding='utf-8') as file:
+        spec = json.load(file)
+
+    tables = spec.get('tables', [])
+    if not tables:
+        raise ValueError(f"No tables defined in {spec_path}.")
+    for index, table_spec in enumerate(tables, start=1):
+        missing_keys = [key for key in TABLE_SPEC_KEYS if key not in table_spec]
+        if missing_keys:
+            raise ValueError(f"Table spec {index} ({table_spec.get('name', 'sin nombre')}) is missing keys: {missing_keys}")
+        if len(table_spec['headers']) != len(table_spec['df_mapping']):
+            raise ValueError(f"Table spec {table_spec['name']}: 'headers' and 'df_mapping' must have the same length.")
+
+    return spec
+
+
+def load_source_dataframe(excel_file, spec):
+    """Reads the source sheet once, sorts it and coerces the numeric columns once."""
+    df_raw = pd.read_excel(excel_file, sheet_name=spec.get('sheet', 'Core'))
+    if spec.get('sort_by'):
+        df_raw = df_raw.sort_values(by=spec['sort_by'])
+    return coerce_numeric_columns(df_raw, spec.get('numeric_columns', NUMERIC_COLUMNS))
+
+
+def _filter_rows(df_source, row_filter):
+    if not row_filter:
+        return df_source
+    mask = pd.Series(True, index=df_source.index)
+    for column, value in row_filter.items():
+        if column not in df_source.columns:
+            raise ValueError(f"Filter column '{column}' is not in the DataFrame.")
+        values = value if isinstance(value, list) else [value]
+        mask &= df_source[column].isin(values)
+    return df_source[mask]
+
+
+def populate_tables(word_document, df_source, spec, bulk=True, placeholder_index=None):
+    """
+    Fills every table listed in the spec. The document tables are indexed once, every
+    table is validated before any of them is modified and the totals placeholders of all
+    the tables are replaced together at the end through the placeholder index.
+    """
+    doc = word_document
+    tables = doc.tables
+    if placeholder_index is None:
+        placeholder_index = build_placeholder_index(doc)
+
+    jobs = []
+    for table_spec in spec['tables']:
+        table_number = table_spec['table_number']
+        if table_number > len(tables) or table_number < 1:
+            raise ValueError(f"Table number {table_number} ({table_spec['name']}) does not exist in the Word file.")
+        table = tables[table_number - 1]
+        df_table = _filter_rows(df_source, table_spec.get('filter'))
+        validate_table(table, df_table, table_number, table_spec['headers_row'], table_spec['headers'], table_spec['types'], table_spec['df_mapping'])
+        jobs.append((table_spec, table, df_table))
+
+    totals = {}
+    for table_spec, table, df_table in jobs:
+        log.info("Populating table %s (%s): %s rows", table_spec['table_number'], table_spec['name'], len(df_table))
+        table_totals = fill_table(table, df_table, table_spec['headers_row'], table_spec['headers'], table_spec['types'],
+                                  table_spec['total'], table_spec['df_mapping'], table_spec['total_headers'], bulk=bulk)
+        for total_header, total_value in table_totals.items():
+            # The first table with a total header fills its placeholder, as when each table replaced it right away
+            if total_header in totals:
+                log.warning("Total {%s} of table %s (%s) ignored: an earlier table already fills it.",
+                            total_header, table_spec['table_number'], table_spec['name'])
+                continue
+            totals[total_header] = total_value
+
+    replace_total_placeholders(doc, totals, placeholder_index)
+    return doc
+
+
+def _fill_table_iterrows(table, df_source, table_headers_row, table_types, table_df_mapping):
+    """The table filling as it was before the column formatting: iterrows, one conversion and prints per cell."""
+    coerce_numeric_columns(df_source)
+    for _ in range(len(table.rows) - table_headers_row):
+        table._element.remove(table.rows[table_headers_row]._element)
+
     def apply_type_conversion(value, column):
         if pd.isnull(value) or value is None:
             print(f"[DEBUG] Column: {column}, Value is null or None.")
@@ -101,48 +480,66 @@ def populate_table(word_document, df_source, table_number, table_headers_row, ta
         print(f"[DEBUG] Column: {column}, No matching type, returning raw value.")
         return str(value).strip()
 
-    # Populate the table
     for index, row in df_source.iterrows():
         new_row = table.add_row().cells
         for col_index, column in enumerate(table_df_mapping):
             value = row[column]
-            transformed_value = apply_type_conversion(value, column)  # No need to pass table_types
+            transformed_value = apply_type_conversion(value, column)
             print(f"Column: {column}, Raw Value: {value}, Transformed Value: {transformed_value}")
             new_row[col_index].text = transformed_value
 
 
-    # Handle totals
-    if table_total:
-        totals = {}
-        for total_header in table_total_headers:
-            if total_header not in table_headers:
-                raise ValueError(f"Total header '{total_header}' is not in Word table headers.")
-            header_index = table_headers.index(total_header)
-            df_col = table_df_mapping[header_index]
-            totals[total_header] = df_source[df_col].sum()
-
-        for paragraph in doc.paragraphs:
-            for total_header, total_value in totals.items():
-                placeholder = f"{{{total_header}}}"
-                if placeholder in paragraph.text:
-                    words = num2words(int(total_value), lang='es').capitalize()
-                    cents = int(round((total_value - int(total_value)) * 100))
-                    formatted_value = f"{total_value:,.2f}".replace(",", " ")
-                    replacement = f"${formatted_value} ({words} pesos {cents:02}/100)"
-                    paragraph.text = paragraph.text.replace(placeholder, replacement)
+def benchmark_populate_table(rows=5000):
+    """
+    Fills a synthetic económica table with `rows` partidas three ways: the original path
+    (iterrows + apply_type_conversion, its prints sent to os.devnull), add_row over the
+    formatted columns and the bulk path (cloned <w:tr>). Prints the timings and checks that
+    the three tables end up with the same text.
+    """
+    headers = ['CLAVES', 'DESCRIPCIÓN', 'PRECIO UNITARIO', 'MARCA', 'PAÍS DE ORIGEN', 'CANTIDAD MÍNIMA ESTIMADA', 'CANTIDAD MÁXIMA ESTIMADA', 'SUBTOTAL', 'IVA', 'TOTAL']
+    df_mapping = ['CLAVE (12 DÍGITOS)', 'Descripción', 'Precio Unitario', 'MARCA O DENOMINACIÓN DISTINTIVA', 'PAÍS DE ORIGEN', 'Cantidad Mínima', 'Cantidad Máxima', 'Importe total Máximo', 'IVA', 'Importe total Máximo']
+    types = {
+        'Precio Unitario': 'currency',
+        'Cantidad Mínima': 'number',
+        'Cantidad Máxima': 'number',
+        'IVA': 'currency',
+        'Importe total Máximo': 'currency'
+    }
 
-        # Add rows for Subtotal, IVA, and Total
-        for label in ["SUBTOTAL", "IVA", "GRAN TOTAL"]:
-            row_cells = table.add_row().cells
-            row_cells[0].text = label
-            for total_header, total_value in totals.items():
-                col_index = table_headers.index(total_header)
-                if label == "IVA":
-                    row_cells[col_index].text = "0.00"
-                else:
-                    row_cells[col_index].text = f"${total_value:,.2f}"
+    rng = np.random.default_rng(0)
+    cantidad_maxima = rng.integers(1, 100000, rows)
+    precio_unitario = rng.integers(100, 10000000, rows) / 100
+    df = pd.DataFrame({
+        'CLAVE (12 DÍGITOS)': [f"010.000.{i:04d}.00" for i in range(rows)],
+        'Descripción': [f"Medicamento de prueba {i} tabletas 500 mg" for i in range(rows)],
+        'Precio Unitario': precio_unitario,
+        'MARCA O DENOMINACIÓN DISTINTIVA': 'Marca',
+        'PAÍS DE ORIGEN': 'México',
+        'Cantidad Mínima': cantidad_maxima // 2,
+        'Cantidad Máxima': cantidad_maxima,
+        'Importe total Máximo': precio_unitario * cantidad_maxima,
+        'IVA': 0.0,
+    })
+
+    results = {}
+    for label in ("iterrows", "add_row", "bulk"):
+        doc = Document()
+        table = doc.add_table(rows=1, cols=len(headers))
+        for cell, header in zip(table.rows[0].cells, headers):
+            cell.text = header
+        start = time.perf_counter()
+        if label == "iterrows":
+            # The prints are still formatted and written; a console is slower than os.devnull
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                _fill_table_iterrows(table, df.copy(), 1, types, df_mapping)
+        else:
+            populate_table(doc, df.copy(), 1, 1, headers, types, False, df_mapping, [], bulk=(label == "bulk"))
+        elapsed = time.perf_counter() - start
+        results[label] = [[cell.text for cell in row.cells] for row in table.rows]
+        print(f"{label:>8}: {elapsed:8.2f} s for {rows:,} rows")
 
-    return doc
+    print(f"Same table contents: iterrows/bulk {results['iterrows'] == results['bulk']}, "
+          f"add_row/bulk {results['add_row'] == results['bulk']}")
 
 
 def show_doc_tables(word_file):
@@ -166,9 +563,9 @@ def save_to_word(word_document, word_file):
     output_file = word_file.replace('.docx', '_updated.docx')
     try:
         word_document.save(output_file)
-        print(f"Document saved successfully as {output_file}.")
+        log.info("Document saved successfully as %s.", output_file)
     except PermissionError:
-        print(f"Error: Unable to save. Please close {output_file} and try again.")
+        log.error("Unable to save. Please close %s and try again.", output_file)
 
 def save_as_pdf(word_file):
     """
@@ -176,19 +573,19 @@ def save_as_pdf(word_file):
     """
     # Check if the Word file exists
     if not os.path.exists(word_file):
-        print(f"Error: The file '{word_file}' does not exist. Please check the path and try again.")
+        log.error("The file '%s' does not exist. Please check the path and try again.", word_file)
         return
 
     # Define the output PDF file path
     pdf_file = word_file.replace(".docx", ".pdf")
-    print(f"Word file: {os.path.abspath(word_file)}")
-    print(f"PDF file: {os.path.abspath(pdf_file)}")
+    log.info("Word file: %s", os.path.abspath(word_file))
+    log.info("PDF file: %s", os.path.abspath(pdf_file))
 
     # Open Word application
     try:
         word = win32.gencache.EnsureDispatch("Word.Application")
     except Exception as e:
-        print(f"Error: Failed to initialize Word application. {e}")
+        log.error("Failed to initialize Word application. %s", e)
         return
 
     doc = None
@@ -204,37 +601,42 @@ def save_as_pdf(word_file):
             OptimizeFor=0,  # Print optimization
             CreateBookmarks=1  # Create bookmarks from headings
         )
-        print(f"PDF successfully created: {os.path.abspath(pdf_file)}")
+        log.info("PDF successfully created: %s", os.path.abspath(pdf_file))
     except Exception as e:
-        print(f"Error: Unable to save as PDF. {e}")
+        log.error("Unable to save as PDF. %s", e)
     finally:
         if doc:
             try:
                 doc.Close(False)
             except Exception as close_error:
-                print(f"Warning: Could not close the document properly: {close_error}")
+                log.warning("Could not close the document properly: %s", close_error)
         word.Quit()
 
 # Generar el Excel de Precios Compranet
-def generador_propuesta_economica_excel():
+def generador_propuesta_economica_excel(fuzzy=False):
     xlsx_template = 'LA-12-NEF-012NEF001-I-1-2025_template_compranet.xlsx'
     source_file = './LA-12-NEF-012NEF001-I-1-2025 Base para PT y PE.xlsx'
     output_folder = './Output'
 
     if not os.path.exists(source_file):
-        print("Source file does not exist.")
+        log.error("Source file does not exist.")
         return
 
     df_source = pd.read_excel(source_file, sheet_name='Core')
     if df_source.empty:
-        print("Dataframe source is empty.")
+        log.error("Dataframe source is empty.")
         return
 
     print("Dataframe source found. Do we proceed extracting the dictionary? (yes/no)")
     while True:
         response = input().strip().lower()
         if response == 'yes':
-            economic_data = extract_dictionary(source_file)
+            economic_data, rejected = extract_dictionary(df_source)
+            if not rejected.empty:
+                os.makedirs(output_folder, exist_ok=True)
+                rejected_path = os.path.join(output_folder, "P01 Partidas rechazadas.xlsx")
+                rejected.to_excel(rejected_path, index=False)
+                log.info("Rejected rows saved to %s", rejected_path)
             break
         elif response == 'no':
             return
@@ -246,14 +648,14 @@ def generador_propuesta_economica_excel():
         while True:
             response = input().strip().lower()
             if response == 'yes':
-                write_economic_data(xlsx_template, economic_data, output_folder)
+                write_economic_data(xlsx_template, economic_data, output_folder, fuzzy=fuzzy)
                 break
             elif response == 'no':
                 return
             else:
                 print("Please answer 'yes' or 'no'.")
     else:
-        print("Economic data is empty or template file is missing.")    
+        log.error("Economic data is empty or template file is missing.")
 
 
 
@@ -263,85 +665,278 @@ def normalize_string_case_insensitive(s):
         return ' '.join(s.strip().upper().split())  # Convert to uppercase for case-insensitive comparison
     return s
 
-def write_economic_data(input_xlsx, dictionary, output_folder):
-    header_row = 6
-    headers = ['DESCRIPCION DETALLADA', 'PRECIO UNITARIO SIN IMPUESTOS', 'MONTO DE LA OFERTA SIN IMPUESTOS', 'IVA', 'OTROS IMPUESTOS', 'MONTO TOTAL DE LA OFERTA']
+def loose_description_key(s):
+    """Accent, punctuation and spacing insensitive key, used to flag near-duplicate descriptions."""
+    text = unicodedata.normalize('NFKD', str(s))
+    return "".join(c for c in text.upper() if c.isalnum() and not unicodedata.combining(c))
 
-    # Load the Excel workbook
-    workbook = openpyxl.load_workbook(input_xlsx)
-    sheet = workbook.active
+def build_description_index(descriptions, first_row):
+    """
+    Maps each normalized description to the sheet rows where it appears.
 
-    # Extract headers from the header row
-    excel_headers = [sheet.cell(row=header_row, column=col).value for col in range(1, sheet.max_column + 1)]
+    Args:
+        descriptions (iterable): Values of the description column, in row order.
+        first_row (int): Sheet row of the first value.
 
-    # Check for missing headers
-    missing_headers = [header for header in headers if header not in excel_headers]
-    if missing_headers:
-        print(f"Missing headers: {missing_headers}")
+    Returns:
+        dict: {normalized description: [row, ...]}
+    """
+    index = {}
+    for row, value in enumerate(descriptions, start=first_row):
+        if value is None:
+            continue
+        index.setdefault(normalize_string_case_insensitive(value), []).append(row)
+    return index
+
+def report_duplicate_descriptions(description_index):
+    """
+    Logs descriptions that appear in more than one row, and descriptions that only differ
+    in accents, punctuation or spacing. Returns both groups.
+    """
+    duplicates = {desc: rows for desc, rows in description_index.items() if len(rows) > 1}
+    if duplicates:
+        log.warning("Descriptions repeated in the template (prices go to the first row):\n%s",
+                    "\n".join(f"- rows {rows}: {desc}" for desc, rows in duplicates.items()))
+
+    by_loose_key = {}
+    for desc in description_index:
+        by_loose_key.setdefault(loose_description_key(desc), []).append(desc)
+    near_duplicates = [descs for descs in by_loose_key.values() if len(descs) > 1]
+    if near_duplicates:
+        log.warning("Near-duplicate descriptions in the template:\n%s",
+                    "\n".join(" | ".join(f"row {description_index[desc][0]}: {desc}" for desc in descs) for descs in near_duplicates))
+
+    return duplicates, near_duplicates
+
+# Coincidencias aproximadas para las descripciones no encontradas
+def description_features(s):
+    """Words and word trigrams of the accent-insensitive description, used by the fuzzy index."""
+    text = unicodedata.normalize('NFKD', str(s).upper())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    words = re.findall(r"[A-Z0-9]+", text)
+    features = {f"w:{word}" for word in words}
+    for word in words:
+        padded = f" {word} "
+        features.update(f"t:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return frozenset(features)
+
+def build_fuzzy_index(description_index):
+    """
+    Inverted index over the template descriptions: feature -> descriptions, plus the
+    inverse document frequency of every feature so rare words weigh more than "MG" or "TABLETA".
+    """
+    features = {desc: description_features(desc) for desc in description_index}
+    postings = {}
+    for desc, desc_features in features.items():
+        for feature in desc_features:
+            postings.setdefault(feature, []).append(desc)
+    total = len(features)
+
+    def feature_idf(document_count):
+        return math.log((total + 1) / (document_count + 0.5))
+
+    idf = {feature: feature_idf(len(descs)) for feature, descs in postings.items()}
+    # A query feature that no description has (a typo) weighs as a feature with df=0
+    return {'features': features, 'postings': postings, 'idf': idf, 'missing_idf': feature_idf(0)}
+
+def fuzzy_candidates(fuzzy_index, query, limit=3, probe_features=12, max_scored=50):
+    """
+    Returns up to `limit` (score, description) pairs for the query. Only the descriptions
+    sharing one of the `probe_features` rarest features of the query are considered, and only
+    the `max_scored` that share the most of them are scored, so a lookup does not touch the
+    whole template. The score is an IDF weighted Jaccard between 0 and 1.
+    """
+    postings = fuzzy_index['postings']
+    idf = fuzzy_index['idf']
+    query_features = description_features(query)
+
+    known_features = sorted((feature for feature in query_features if feature in postings), key=lambda feature: len(postings[feature]))
+    hits = Counter()
+    for feature in known_features[:probe_features]:
+        hits.update(postings[feature])
+    candidates = [desc for desc, _ in hits.most_common(max_scored)]
+
+    # Features that never appear in the template still count against the match
+    missing_weight = fuzzy_index['missing_idf']
+    scored = []
+    for desc in candidates:
+        desc_features = fuzzy_index['features'][desc]
+        shared = sum(idf[feature] for feature in query_features & desc_features)
+        union = sum(idf.get(feature, missing_weight) for feature in query_features | desc_features)
+        if union:
+            scored.append((shared / union, desc))
+    scored.sort(key=lambda pair: (-pair[0], str(pair[1])))
+    return scored[:limit]
+
+def write_fuzzy_match_report(not_found, description_index, output_folder, limit=3, min_score=0.3):
+    """
+    Scores the best template candidates for every description that had no exact match and
+    saves them with their confidence to 'P01 Coincidencias aproximadas.xlsx'.
+    """
+    fuzzy_index = build_fuzzy_index(description_index)
+    report = []
+    for desc in not_found:
+        candidates = [(score, candidate) for score, candidate in fuzzy_candidates(fuzzy_index, desc, limit=limit) if score >= min_score]
+        if not candidates:
+            report.append({'Descripción': desc, 'Rango': None, 'Candidato': None, 'Fila': None, 'Confianza': 0.0})
+        for rank, (score, candidate) in enumerate(candidates, start=1):
+            report.append({'Descripción': desc, 'Rango': rank, 'Candidato': candidate,
+                           'Fila': description_index[candidate][0], 'Confianza': round(score, 3)})
+
+    os.makedirs(output_folder, exist_ok=True)
+    report_path = os.path.join(output_folder, "P01 Coincidencias aproximadas.xlsx")
+    pd.DataFrame(report, columns=['Descripción', 'Rango', 'Candidato', 'Fila', 'Confianza']).to_excel(report_path, index=False)
+    matched = sum(1 for row in report if row['Rango'] == 1)
+    log.info("Fuzzy match report saved to %s (%s of %s descriptions with candidates)", report_path, matched, len(not_found))
+    return report
+
+COMPRANET_HEADERS = ['DESCRIPCION DETALLADA', 'PRECIO UNITARIO SIN IMPUESTOS', 'MONTO DE LA OFERTA SIN IMPUESTOS', 'IVA', 'OTROS IMPUESTOS', 'MONTO TOTAL DE LA OFERTA']
+
+def scan_compranet_template(input_xlsx, headers=COMPRANET_HEADERS, header_row=6):
+    """
+    Phase one: a read-only, values-only pass over the template that reads the headers of
+    `header_row` and the row of every description, without building the workbook object model.
+
+    Returns:
+        tuple: ({header: column}, description index) or None if headers are missing.
+    """
+    workbook = openpyxl.load_workbook(input_xlsx, read_only=True)
+    try:
+        rows = workbook.active.iter_rows(min_row=header_row, values_only=True)
+        excel_headers = list(next(rows, ()))
+
+        # Check for missing headers
+        missing_headers = [header for header in headers if header not in excel_headers]
+        if missing_headers:
+            log.error("Missing headers: %s", missing_headers)
+            return None
+
+        # Normalize headers for indexing
+        normalized_excel_headers = [normalize_string_case_insensitive(header) for header in excel_headers]
+        columns = {header: normalized_excel_headers.index(normalize_string_case_insensitive(header)) + 1 for header in headers}
+        description_offset = columns['DESCRIPCION DETALLADA'] - 1
+        descriptions = [values[description_offset] if description_offset < len(values) else None for values in rows]
+    finally:
+        workbook.close()
+    return columns, build_description_index(descriptions, header_row + 1)
+
+def apply_compranet_prices(input_xlsx, cell_values, output_path):
+    """
+    Phase two: copies the template with only the changed cells rewritten in the sheet XML
+    (see xlsx_patch), so the rest of the file is the template as Compranet gave it. A sheet
+    the patcher does not handle is written with openpyxl, as before.
+
+    Args:
+        cell_values (dict): {row: {column: value}}
+    """
+    try:
+        write_cells(input_xlsx, output_path, cell_values)
         return
+    except ValueError as e:
+        log.info("Writing %s with openpyxl: %s", output_path, e)
+    workbook = openpyxl.load_workbook(input_xlsx)
+    sheet = workbook.active
+    for row, values in cell_values.items():
+        for column, value in values.items():
+            sheet.cell(row=row, column=column, value=value)
+    workbook.save(output_path)
 
-    print("All expected headers are present.")
+def write_economic_data(input_xlsx, dictionary, output_folder, fuzzy=False):
+    scan = scan_compranet_template(input_xlsx)
+    if scan is None:
+        return
+    columns, description_index = scan
 
-    # Normalize headers for indexing
-    normalized_excel_headers = [normalize_string_case_insensitive(header) for header in excel_headers]
+    log.info("All expected headers are present.")
+    report_duplicate_descriptions(description_index)
 
-    # Locate and replace data
+    # Locate the rows of every description and collect the cells to change
+    cell_values = {}
     not_found = []
     for desc, values in dictionary.items():
-        normalized_desc = normalize_string_case_insensitive(desc)
-        found = False
-        for row in range(header_row + 1, sheet.max_row + 1):
-            cell_value = sheet.cell(row=row, column=normalized_excel_headers.index(normalize_string_case_insensitive('DESCRIPCION DETALLADA')) + 1).value
-            if normalize_string_case_insensitive(cell_value) == normalized_desc:
-                found = True
-                for key, value in values.items():
-                    if key in headers:
-                        col = normalized_excel_headers.index(normalize_string_case_insensitive(key)) + 1
-                        sheet.cell(row=row, column=col, value=value)
-                break
-        if not found:
+        rows = description_index.get(normalize_string_case_insensitive(desc))
+        if not rows:
             not_found.append(desc)
+            continue
+        row = rows[0]
+        for key, value in values.items():
+            if key in columns:
+                cell_values.setdefault(row, {})[columns[key]] = value
 
     if not_found:
-        print("Descriptions not found:")
-        for desc in not_found:
-            print(f"- {desc}")
+        log.warning("Descriptions not found:\n%s", "\n".join(f"- {desc}" for desc in not_found))
+        if fuzzy:
+            write_fuzzy_match_report(not_found, description_index, output_folder)
 
     # Save the updated workbook
     os.makedirs(output_folder, exist_ok=True)
     output_path = os.path.join(output_folder, "P01 Precios Compranet.xlsx")
-    workbook.save(output_path)
-    print(f"File saved to {output_path}")
+    apply_compranet_prices(input_xlsx, cell_values, output_path)
+    log.info("File saved to %s (%s cells updated)", output_path, sum(len(values) for values in cell_values.values()))
 
-def extract_dictionary(xlsx_file):
-    df = pd.read_excel(xlsx_file, sheet_name='Core')
-    
-    if 'Descripción' not in df.columns or 'Cantidad Máxima' not in df.columns or 'Precio Unitario' not in df.columns:
-        print("Required columns are missing in the input file.")
-        return {}
-
-    dictionary = {}
-    for _, row in df.iterrows():
-        descripcion = row['Descripción']
-        cantidad_maxima = row['Cantidad Máxima']
-        precio_unitario = row['Precio Unitario']
-
-        if isinstance(cantidad_maxima, (int, float)) and isinstance(precio_unitario, (int, float)) and cantidad_maxima > 0 and precio_unitario > 0:
-            dictionary[descripcion] = {
-                'DESCRIPCION DETALLADA': descripcion,
-                'PRECIO UNITARIO SIN IMPUESTOS': precio_unitario,
-                'MONTO DE LA OFERTA SIN IMPUESTOS': precio_unitario * cantidad_maxima,
-                'IVA': 0,
-                'OTROS IMPUESTOS': 0,
-                'MONTO TOTAL DE LA OFERTA': precio_unitario * cantidad_maxima
-            }
-    
-    return dictionary
+def extract_dictionary(df):
+    """
+    Builds the Compranet values for every row of the 'Core' sheet with a positive quantity
+    and unit price. When a description repeats, the last valid row wins, as before.
+
+    Args:
+        df (DataFrame): The 'Core' sheet.
+
+    Returns:
+        tuple: ({Descripción: {Compranet header: value}}, DataFrame of the rejected rows
+        with the reason in the 'Motivo' column)
+    """
+    required_columns = ['Descripción', 'Cantidad Máxima', 'Precio Unitario']
+    if any(column not in df.columns for column in required_columns):
+        log.error("Required columns are missing in the input file.")
+        return {}, pd.DataFrame(columns=list(df.columns) + ['Motivo'])
+
+    descripcion = df['Descripción']
+    cantidad_maxima = pd.to_numeric(df['Cantidad Máxima'], errors='coerce')
+    precio_unitario = pd.to_numeric(df['Precio Unitario'], errors='coerce')
+
+    conditions = [
+        descripcion.isna(),
+        cantidad_maxima.isna(),
+        precio_unitario.isna(),
+        cantidad_maxima <= 0,
+        precio_unitario <= 0,
+    ]
+    reasons = [
+        'Descripción vacía',
+        'Cantidad Máxima no numérica',
+        'Precio Unitario no numérico',
+        'Cantidad Máxima no positiva',
+        'Precio Unitario no positivo',
+    ]
+    motivo = pd.Series(np.select(conditions, reasons, default=''), index=df.index)
+    valid = motivo == ''
+    duplicated = descripcion.where(valid).duplicated(keep='last') & valid
+    motivo[duplicated] = 'Descripción duplicada (se usa la última fila)'
+    valid &= ~duplicated
+
+    monto = precio_unitario[valid] * cantidad_maxima[valid]
+    dictionary = {
+        desc: {
+            'DESCRIPCION DETALLADA': desc,
+            'PRECIO UNITARIO SIN IMPUESTOS': precio,
+            'MONTO DE LA OFERTA SIN IMPUESTOS': importe,
+            'IVA': 0,
+            'OTROS IMPUESTOS': 0,
+            'MONTO TOTAL DE LA OFERTA': importe
+        }
+        for desc, precio, importe in zip(descripcion[valid].tolist(), precio_unitario[valid].tolist(), monto.tolist())
+    }
+
+    rejected = df[~valid].assign(Motivo=motivo[~valid])
+    if not rejected.empty:
+        log.warning("%s row(s) rejected: %s", len(rejected), rejected['Motivo'].value_counts().to_dict())
+    return dictionary, rejected
 
 # Generar la propuesta económica en excel 
 
 def populate_excel():
-    print("La función no está lista, abre manualmente el word y el excel y pega la propuesta económica en el template")
+    log.warning("La función no está lista, abre manualmente el word y el excel y pega la propuesta económica en el template")
 
 #Print Bookmarks
 def printBookmarks(word_file):
@@ -361,105 +956,23 @@ def printBookmarks(word_file):
 
 # Orquestador
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Llena las tablas de Cartas.docx y genera la propuesta económica.")
+    parser.add_argument('--spec', help=f"JSON table spec (default: '{TABLE_SPEC_FILENAME}' next to Cartas.docx, or the one shipped with the scripts).")
+    parser.add_argument('--fuzzy', action='store_true', help="Write a fuzzy match report for the descriptions not found in the Compranet template.")
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    configure_from_args(args)
+
     word_file = os.path.join(working_folder, 'Cartas.docx')
     doc = Document(word_file)
     excel_file = os.path.join(working_folder, 'Cartas.xlsx')
 
-    df_raw = pd.read_excel(excel_file, sheet_name='Core')
-    df_raw = df_raw.sort_values(by='NUMERO DE PARTIDA')
-    df_eseotres = df_raw[df_raw['Membrete'] == 'Eseotres']
-    df_venus = df_raw[df_raw['Membrete'] == 'Venus']
-    df_rafarm = df_raw[df_raw['Membrete'] == 'Rafarm']
-    df_labopharma = df_raw[df_raw['Membrete'] == 'Labotec']
+    spec_path = args.spec or default_table_spec_path()
     human_check_word = os.path.join(working_folder, 'Cartas_updated.docx')
-    
-    # Tabla de normas
-    normas_table = 7
-    normas_headers_row = 1
-    normas_headers = ['PARTIDA', 'CLAVE DEL COMPENDIO NACIONAL DE INSUMOS PARA LA SALUD', 'DENOMINACIÓN', 'NORMA']
-    normas_types = {
-        'NUMERO DE PARTIDA': 'string',
-        'CLAVE (12 DÍGITOS)': 'string',
-        'Descripción': 'string',
-        'Norma': 'string'
-    }
-    normas_total = False
-    normas_df_mapping = ['NUMERO DE PARTIDA', 'CLAVE (12 DÍGITOS)', 'Descripción', 'Norma']
-    normas_total_headers = []
-    
-    #Propuesta económica
-    económica_table = 28
-    económica_headers_row = 1
-    económica_headers = ['CLAVES', 'DESCRIPCIÓN', 'PRECIO UNITARIO', 'MARCA', 'PAÍS DE ORIGEN', 'CANTIDAD MÍNIMA ESTIMADA', 'CANTIDAD MÁXIMA ESTIMADA', 'SUBTOTAL', 'IVA', 'TOTAL']
-    economica_df_mapping = ['CLAVE (12 DÍGITOS)', 'Descripción', 'Precio Unitario', 'MARCA O DENOMINACIÓN DISTINTIVA', 'PAÍS DE ORIGEN', 'Cantidad Mínima', 'Cantidad Máxima', 'Importe total Máximo', 'IVA', 'Importe total Máximo'] 
-    economica_types = { 
-        'Precio Unitario': 'currency',
-        'Cantidad Mínima': 'number',
-        'Cantidad Máxima': 'number',
-        'IVA': 'currency',
-        'Importe total Máximo': 'currency'
-        }
-    economica_total = False
-    economica_total_headers = ['CANTIDAD MÍNIMA ESTIMADA', 'CANTIDAD MÁXIMA ESTIMADA'] 
-    
-    tecnica_table = 30
-    tecnica_headers_row = 1
-    tecnica_headers = ['PARTIDA', 'CLAVE A 12 DÍGITOS', 'DENOMINACIÓN GENÉRICA', 'DESCRIPCIÓN DETALLADA DEL BIEN', 'PRESENTACIÓN', 'CANTIDAD MÍNIMA OFERTADA', 'CANTIDAD MÁXIMA OFERTADA', 'MARCA O DENOMINACIÓN DISTINTIVA', 'FABRICANTE', 'PAÍS DE ORIGEN', 'NÚMERO DE REGISTRO SANITARIO', 'CÓDIGO DE BARRAS (CUANDO APLIQUE)']
-    tecnica_df_mapping = ['NUMERO DE PARTIDA', 'CLAVE (12 DÍGITOS)', 'NOMBRE GENÉRICO', 'Descripción', 'Unidad de Medida', 'Cantidad Mínima', 'Cantidad Máxima', 'MARCA O DENOMINACIÓN DISTINTIVA', 'FABRICANTE', 'PAÍS DE ORIGEN', 'NÚMERO DE REGISTRO SANITARIO', 'CÓDIGO DE BARRAS']
-    tecnica_types = { 
-        'NUMERO DE PARTIDA': 'string',
-        'GPO': 'string',
-        'GEN': 'string',
-        'ESP': 'string',
-        'DF': 'string',
-        'NOMBRE GENÉRICO': 'string',
-        'Descripción': 'string',
-        'UNI': 'string',
-        'CANT': 'number',
-        'TIPO': 'string', 
-        'Cantidad Mínima': 'number', 
-        'Cantidad Máxima': 'number',
-        'MARCA O DENOMINACIÓN DISTINTIVA': 'string',
-        'FABRICANTE': 'string',
-        'PAÍS DE ORIGEN': 'string',
-        'NÚMERO DE REGISTRO SANITARIO': 'string', 
-        'CÓDIGO DE BARRAS': 'string'
-        }    
-    tecnica_total = False
-    tecnica_total_headers = []
-
-    #Tabla de normas 2
-    normas_table_2 = 32
-    
-    #Tabla con marbete eseotres para todas las claves de Caducidad
-    caducidadEseotres = 33
-    caducidadTodosFabricantes_row = 1
-    caducidadTodosFabricantes_headers = ['PART NO.', 'CLAVE', 'DESCRIPCIÓN BREVE', 'CADUCIDAD MÍNIMA DE LOS BIENES']
-
-    caducidadTodosFabricantes_df_mapping = ['NUMERO DE PARTIDA','CLAVE (12 DÍGITOS)', 'NOMBRE GENÉRICO', 'Caducidad mínima']
-    caducidadTodosFabricantes_types = { 
-        'NUMERO DE PARTIDA': 'string',
-        'CLAVE (12 DÍGITOS)': 'string',
-        'NOMBRE GENÉRICO': 'string',
-        'Caducidad mínima': 'string'
-    }
-    caducidadTodosFabricantes_total = False
-    caducidadTodosFabricantes_total_headers = []
-    ##Rafarm apoyo
-    Rafarm_apoyo_table = 36
-    Rafarm_apoyo_row = 1
-    Rafarm_apoyo_headers = ['CLAVE', 'DESCRIPCIÓN', 'CANTIDAD MÁXIMA REQUERIDA\n2025-2026', 'REGISTRO SANITARIO', 'CANTIDAD O PORCENTAJE QUE RESPALDA']
-    Rafarm_apoyo_types = {
-        'CLAVE': 'string',
-        'DESCRIPCIÓN': 'string',
-        'Cantidad Máxima': 'number',
-        'REGISTRO SANITARIO': 'string',
-        'CANTIDAD O PORCENTAJE QUE RESPALDA': 'string'
-    }
-    Rafarm_apoyo_df_mapping = ['CLAVE (12 DÍGITOS)', 'Descripción', 'Cantidad Máxima', 'NÚMERO DE REGISTRO SANITARIO','% RESPALDADO']
-    Rafarm_total_headers = []
-    Rafarm_total = False
 
     while True:
         print("\nMenu:")
@@ -468,31 +981,25 @@ def main():
         print("3) Save word to PDF preserving headers: working")
         print("4) Genera el excel de propuesta económica")
         print("5) Imprime los headers del archivo poblado")
-        choice = input("Choose an option (1, 2, 3, 4, 5): ")
+        print("6) Benchmark del llenado de tablas (5,000 filas)")
+        choice = input("Choose an option (1, 2, 3, 4, 5, 6): ")
         
         if choice == '1':
             show_doc_tables(word_file)
         elif choice == '2':
-            #Normas
-            doc = populate_table(doc, df_raw, normas_table, normas_headers_row, normas_headers, normas_types, normas_total, normas_df_mapping, normas_total_headers)
-            #Económica
-            doc = populate_table(doc, df_raw, económica_table, económica_headers_row, económica_headers, economica_types, economica_total, economica_df_mapping, economica_total_headers)
-            #Técncica
-            doc = populate_table(doc, df_raw, tecnica_table, tecnica_headers_row, tecnica_headers, tecnica_types, tecnica_total, tecnica_df_mapping, tecnica_total_headers)
-            #Normas 2
-            doc = populate_table(doc, df_raw, normas_table_2, normas_headers_row, normas_headers, normas_types, normas_total, normas_df_mapping, normas_total_headers)
-            #Caducidad SO3
-            doc = populate_table(doc, df_raw, caducidadEseotres, caducidadTodosFabricantes_row, caducidadTodosFabricantes_headers, caducidadTodosFabricantes_types, caducidadTodosFabricantes_total, caducidadTodosFabricantes_df_mapping, caducidadTodosFabricantes_total_headers)
-            #RAFARM apoyo
-            doc = populate_table(doc, df_raw, Rafarm_apoyo_table, Rafarm_apoyo_row, Rafarm_apoyo_headers, Rafarm_apoyo_types, Rafarm_total, Rafarm_apoyo_df_mapping, Rafarm_total_headers)
+            spec = load_table_specs(spec_path)
+            df_raw = load_source_dataframe(excel_file, spec)
+            doc = populate_tables(doc, df_raw, spec)
             save_to_word(doc, word_file)       
         elif choice == '3': 
 
             save_as_pdf(human_check_word)
         elif choice == '4': 
-            generador_propuesta_economica_excel()
+            generador_propuesta_economica_excel(fuzzy=args.fuzzy)
         elif choice == '5': 
             printBookmarks(human_check_word)
+        elif choice == '6':
+            benchmark_populate_table()
         else:
             print("Invalid choice. Please select either 1, 2, or 3.")
             continue  # Ask again if the input is invalid
@@ -1,8 +1,26 @@
 import os
 import sys
 import re
+import argparse
+import contextlib
+import functools
+import time
+import collections
+import csv
+import hashlib
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import PyPDF2
 import pdfplumber
+try:
+    import pytesseract  # Optional: OCR of scanned pages (also needs the tesseract program installed)
+except ImportError:
+    pytesseract = None
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Optional: only for --format parquet
+    pyarrow = None
 
 # Define script paths
 script_directory = os.path.dirname(os.path.abspath(__file__))
@@ -10,107 +28,563 @@ working_folder = os.path.abspath(os.path.join(script_directory, '..'))
 function_library = os.path.abspath(os.path.join(script_directory, 'Library'))
 sys.path.append(function_library)  # Add the library folder to the path.
 import pandas as pd
+from logging_setup import get_logger, add_logging_arguments, configure_from_args, configure_logging, current_logging_config
+from disk_cache import (DEFAULT_MAX_BYTES, file_digest, make_key, cache_lookup, cache_get, cache_put,
+                        open_entry, commit_entry, discard_entry)
+
+log = get_logger('requisitos')
+
+# Extractores por página: cada uno abre el PDF una sola vez y devuelve (número de páginas, función página -> texto)
+def _open_pdfplumber(pdf_path, stack):
+    pdf = stack.enter_context(pdfplumber.open(pdf_path))
+
+    def extract(page_index):
+        page = pdf.pages[page_index]
+        try:
+            return page.extract_text()
+        finally:
+            page.close()  # Drop the parsed objects of the page, memory stays flat on long annexes
+
+    return len(pdf.pages), extract
+
+def _open_pypdf(pdf_path, stack):
+    file = stack.enter_context(open(pdf_path, "rb"))
+    reader = PyPDF2.PdfReader(file)
+    return len(reader.pages), lambda page_index: reader.pages[page_index].extract_text()
+
+PAGE_EXTRACTORS = {
+    'pdfplumber': _open_pdfplumber,
+    'PyPDF2': _open_pypdf,
+}
+DEFAULT_EXTRACTOR_ORDER = ('pdfplumber', 'PyPDF2')
+
+def new_extraction_stats():
+    """{'seconds': {extractor: s}, 'tried': {extractor: pages}, 'used': {extractor: pages}}"""
+    return {'seconds': {}, 'tried': {}, 'used': {}}
+
+def merge_extraction_stats(total, stats):
+    for group, values in stats.items():
+        for name, value in values.items():
+            total[group][name] = total[group].get(name, 0) + value
+    return total
+
+def iter_pages_with_fallback(pdf_path, max_pages=None, extractor_order=DEFAULT_EXTRACTOR_ORDER, stats=None):
+    """
+    Yields (page index, text, extractor) for every page. Each page is read with the first
+    extractor of extractor_order; the next ones are only used for the pages that came back
+    empty. Every extractor opens the PDF once, and only when it is first needed. The
+    extractor is 'none' for pages without text. Time and pages per extractor go to `stats`.
+    """
+    stats = stats if stats is not None else new_extraction_stats()
+    with contextlib.ExitStack() as stack:
+        readers = {}
+
+        def reader(name):
+            if name not in readers:
+                try:
+                    readers[name] = PAGE_EXTRACTORS[name](pdf_path, stack)
+                except Exception as e:
+                    log.error("Error reading %s with %s: %s", pdf_path, name, e)
+                    readers[name] = None
+            return readers[name]
+
+        page_count = next((reader(name)[0] for name in extractor_order if reader(name) is not None), 0)
+        if max_pages is not None:
+            page_count = min(page_count, max_pages)
+
+        for page_index in range(page_count):
+            text, used = "", 'none'
+            for name in extractor_order:
+                opened = reader(name)
+                if opened is None or page_index >= opened[0]:
+                    continue
+                start = time.perf_counter()
+                try:
+                    text = opened[1](page_index) or ""
+                except Exception as e:
+                    log.debug("Error extracting page %s of %s with %s: %s", page_index, pdf_path, name, e)
+                    text = ""
+                stats['seconds'][name] = stats['seconds'].get(name, 0) + time.perf_counter() - start
+                stats['tried'][name] = stats['tried'].get(name, 0) + 1
+                if text.strip():
+                    used = name
+                    break
+                log.debug("No text extracted from page %s in %s with %s", page_index, pdf_path, name)
+            stats['used'][used] = stats['used'].get(used, 0) + 1
+            yield page_index, text, used
+
+def _join_pages(pages):
+    return "".join(text + "\n" for _, text, _ in pages if text)
 
 def extract_text_from_pdf_pypdf(pdf_path):
     """Extracts text from a PDF file using PyPDF2 (fallback)."""
-    print(f"Extracting text with PyPDF2 from: {pdf_path}")  # Debug
-    text = ""
-    try:
-        with open(pdf_path, "rb") as file:
-            reader = PyPDF2.PdfReader(file)
-            for page_num, page in enumerate(reader.pages):
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    print(f"Warning: No text found on page {page_num} in {pdf_path}")  # Debug
-    except Exception as e:
-        print(f"Error reading {pdf_path} with PyPDF2: {e}")  # Debug
-    return text
+    return _join_pages(iter_pages_with_fallback(pdf_path, extractor_order=('PyPDF2',)))
 
 def extract_text_from_pdf_plumber(pdf_path):
     """Extracts text from a PDF file using pdfplumber."""
-    print(f"Extracting text with pdfplumber from: {pdf_path}")  # Debug
-    text = ""
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages:
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-                else:
-                    print(f"Warning: No text extracted from page {pdf.pages.index(page)}")  # Debug
-    except Exception as e:
-        print(f"Error reading {pdf_path} with pdfplumber: {e}")  # Debug
-    return text
+    return _join_pages(iter_pages_with_fallback(pdf_path, extractor_order=('pdfplumber',)))
 
 def extract_text_with_fallback(pdf_path):
-    """Tries pdfplumber first; if it fails, falls back to PyPDF2."""
-    text = extract_text_from_pdf_plumber(pdf_path)  # Try pdfplumber first
+    """Tries pdfplumber first on every page; the pages it can't read fall back to PyPDF2."""
+    return _join_pages(iter_pages_with_fallback(pdf_path))
+
+# Bump when the extraction logic changes so older cache entries are not reused
+EXTRACTOR_VERSION = 3
+PAGE_SEPARATOR = "\f"  # Between pages in the cache entries
+
+def extraction_cache_key(pdf_path, extractor_order=DEFAULT_EXTRACTOR_ORDER, ocr=None):
+    """Key of the cached pages: file contents, extractors, OCR settings and library versions."""
+    ocr_settings = (ocr['dpi'], ocr['lang']) if ocr else None
+    return make_key(file_digest(pdf_path), '+'.join(extractor_order), ocr_settings, EXTRACTOR_VERSION,
+                    pdfplumber.__version__, PyPDF2.__version__)
+
+# OCR de las páginas escaneadas (sin capa de texto)
+OCR_DEFAULTS = dict(dpi=300, lang='spa', workers=2, window=8, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES)
+OCR_FAILED = 'ocr-failed'  # Extractor of a page Tesseract could not read: the document is not cached, so it is retried
+
+def ocr_available():
+    """True when pytesseract is installed and can run the tesseract program."""
+    if pytesseract is None:
+        return False
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        return False
+    return True
+
+def page_fingerprint(reader, page_index):
+    """
+    SHA-256 of what a page draws: its content stream plus the data of every XObject it
+    uses (the scanned image, forms and their own XObjects). Same scan, same fingerprint,
+    whichever file it is in.
+    """
+    digest = hashlib.sha256()
+    page = reader.pages[page_index]
+    contents = page.get_contents()
+    if contents is not None:
+        digest.update(contents.get_data())
+
+    seen = set()
+    resources = [page.get('/Resources')]
+    while resources:
+        resource = resources.pop()
+        resource = resource.get_object() if resource is not None else None
+        if not resource or '/XObject' not in resource:
+            continue
+        for name, reference in sorted(resource['/XObject'].get_object().items()):
+            identifier = getattr(reference, 'idnum', None)
+            if identifier is not None:
+                if identifier in seen:
+                    continue
+                seen.add(identifier)
+            xobject = reference.get_object()
+            digest.update(name.encode('utf-8'))
+            digest.update(xobject.get_data())
+            resources.append(xobject.get('/Resources'))
+    return digest.hexdigest()
+
+def _open_page_renderer(pdf_path, stack):
+    """
+    Page -> PIL image at a given DPI, with pypdfium2 (installed with pdfplumber). pdfium is
+    not thread safe, so renders are serialized; Tesseract itself runs in parallel.
+    """
+    import pypdfium2
+    lock = threading.Lock()
+    document = []
+
+    def close():
+        if document:
+            document[0].close()
+
+    def render(page_index, dpi):
+        with lock:
+            if not document:
+                document.append(pypdfium2.PdfDocument(pdf_path))
+            page = document[0][page_index]
+            try:
+                return page.render(scale=dpi / 72).to_pil()
+            finally:
+                page.close()
+
+    stack.callback(close)
+    return render
+
+def _ocr_page(render, page_index, dpi, lang):
+    start = time.perf_counter()
+    image = render(page_index, dpi)
+    text = pytesseract.image_to_string(image, lang=lang)
+    return text, time.perf_counter() - start
+
+def iter_pages_with_ocr(pdf_path, pages, ocr, stats=None):
+    """
+    OCR stage over a (page index, text, extractor) stream: only the pages without text
+    (extractor 'none') are rasterized at ocr['dpi'] and read by Tesseract, in a pool of
+    ocr['workers'] threads. Up to ocr['window'] pages are read ahead so the scans overlap,
+    and pages still come out in order. Results are cached by page fingerprint in
+    ocr['cache_dir'], so every scanned page goes through Tesseract at most once. A page
+    where Tesseract fails comes out empty with extractor OCR_FAILED.
+    """
+    stats = stats if stats is not None else new_extraction_stats()
+    tesseract_version = str(pytesseract.get_tesseract_version())
+    pending = collections.deque()
+
+    with contextlib.ExitStack() as stack:
+        render = _open_page_renderer(pdf_path, stack)
+        readers = []  # PyPDF2 reader for the fingerprints, opened with the first scanned page
+        executor = ThreadPoolExecutor(max_workers=ocr['workers'])
+        stack.callback(executor.shutdown, cancel_futures=True)  # Runs first: no renders after the PDF closes
+
+        def submit(page_index):
+            try:
+                if not readers:
+                    readers.append(PyPDF2.PdfReader(stack.enter_context(open(pdf_path, "rb"))))
+                key = make_key('ocr', page_fingerprint(readers[0], page_index), ocr['dpi'], ocr['lang'], tesseract_version)
+            except Exception as e:
+                log.debug("Could not fingerprint page %s of %s: %s", page_index, pdf_path, e)
+                key = None
+            if key and ocr['cache_dir']:
+                text = cache_get(ocr['cache_dir'], key)
+                if text is not None:
+                    return key, text
+            return key, executor.submit(_ocr_page, render, page_index, ocr['dpi'], ocr['lang'])
+
+        def finish(page_index, text, extractor, key, job):
+            if job is None:
+                return page_index, text, extractor
+            if isinstance(job, str):
+                text, extractor = job, 'ocr-cache'
+            else:
+                try:
+                    text, seconds = job.result()
+                except Exception as e:
+                    log.warning("OCR failed on page %s of %s: %s", page_index, pdf_path, e)
+                    return page_index, "", OCR_FAILED
+                stats['seconds']['ocr'] = stats['seconds'].get('ocr', 0) + seconds
+                stats['tried']['ocr'] = stats['tried'].get('ocr', 0) + 1
+                if key and ocr['cache_dir']:
+                    try:
+                        cache_put(ocr['cache_dir'], key, text, ocr['cache_max_bytes'])
+                    except OSError as e:
+                        log.warning("Could not write the OCR cache in %s: %s", ocr['cache_dir'], e)
+                extractor = 'ocr'
+            if not text.strip():
+                return page_index, text, 'none'
+            stats['used']['none'] -= 1  # Counted as empty by iter_pages_with_fallback
+            stats['used'][extractor] = stats['used'].get(extractor, 0) + 1
+            return page_index, text, extractor
+
+        for page_index, text, extractor in pages:
+            if extractor == 'none':
+                pending.append((page_index, text, extractor, *submit(page_index)))
+            else:
+                pending.append((page_index, text, extractor, None, None))
+            while pending and (pending[0][4] is None or len(pending) > ocr['window']):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+def _iter_cached_pages(cache_path, max_pages=None, chunk_size=64 * 1024):
+    with open(cache_path, 'r', encoding='utf-8') as file:
+        pending = ""
+        page_index = 0
+        for chunk in iter(lambda: file.read(chunk_size), ""):
+            pending += chunk
+            *pages, pending = pending.split(PAGE_SEPARATOR)
+            for page_text in pages:
+                if max_pages is not None and page_index >= max_pages:
+                    return
+                yield page_index, page_text, 'cache'
+                page_index += 1
+
+def _iter_pages_into_cache(pages, cache_dir, key, cache_max_bytes):
+    # The entry is only kept if every page was read, and only if there was at least one: a
+    # PDF no extractor could open has none, and caching it would hide the error next time.
+    # Likewise a page OCR failed on (OCR_FAILED) must be retried next time, not cached empty.
+    # The cache only saves time: when it cannot be written (missing or read-only folder,
+    # file locked by another process, full disk, ...) the pages still come out, uncached
+    try:
+        entry = open_entry(cache_dir)
+    except OSError as e:
+        log.warning("Could not write the extraction cache in %s: %s", cache_dir, e)
+        entry = None
+    page_count = 0
+    complete = True
+    try:
+        for page in pages:
+            page_count += 1
+            complete = complete and page[2] != OCR_FAILED
+            if entry is not None:
+                try:
+                    entry[0].write(page[1].replace(PAGE_SEPARATOR, " ") + PAGE_SEPARATOR)
+                except OSError as e:
+                    log.warning("Could not write the extraction cache in %s: %s", cache_dir, e)
+                    discard_entry(entry)
+                    entry = None
+            yield page
+    except BaseException:  # Extraction error or a consumer that stopped early
+        if entry is not None:
+            discard_entry(entry)
+        raise
+    if entry is not None and not (page_count and complete):
+        discard_entry(entry)
+    elif entry is not None:
+        try:
+            commit_entry(cache_dir, key, entry, cache_max_bytes)
+        except OSError as e:
+            log.warning("Could not write the extraction cache in %s: %s", cache_dir, e)
+
+def open_page_stream(pdf_path, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, max_pages=None,
+                     extractor_order=DEFAULT_EXTRACTOR_ORDER, stats=None, ocr=None):
+    """
+    (page index, text, extractor) generator for one PDF, read from the extraction cache
+    when possible (extractor 'cache'). With ocr settings (see OCR_DEFAULTS) the pages
+    without text go through iter_pages_with_ocr. Documents read only partially (max_pages
+    or a consumer that stops early), that no extractor could open or with a page OCR failed
+    on are not cached.
+
+    Returns:
+        tuple: (page generator, True if the pages come from the cache)
+    """
+    stats = stats if stats is not None else new_extraction_stats()  # Shared by both stages
 
-    if not text.strip():  # If empty, try PyPDF2
-        print("Fallback to PyPDF2 as pdfplumber failed.")  # Debug
-        text = extract_text_from_pdf_pypdf(pdf_path)
+    def extract(max_pages):
+        pages = iter_pages_with_fallback(pdf_path, max_pages, extractor_order, stats)
+        return iter_pages_with_ocr(pdf_path, pages, ocr, stats) if ocr else pages
 
-    return text
+    if not cache_dir:
+        return extract(max_pages), False
+
+    key = extraction_cache_key(pdf_path, extractor_order, ocr)
+    cache_path = cache_lookup(cache_dir, key)
+    if cache_path is not None:
+        log.debug("Cache hit for %s", pdf_path)
+        return _iter_cached_pages(cache_path, max_pages), True
+    if max_pages is not None:
+        return extract(max_pages), False
+    return _iter_pages_into_cache(extract(None), cache_dir, key, cache_max_bytes), False
 
 def fix_broken_lines(text):
     """Fixes broken lines in extracted text."""
     return text.replace("\n", " ")
 
-def extract_data_from_textPYPDF(text, search_dict):
-    """Extracts data from text using search dictionary."""
-    extracted_data = []
+def iter_structured_blocks(pages, max_block_chars=20000):
+    """
+    Yields the text inside every {...} block while the pages stream in. A block still open
+    at the end of a page continues on the next one. An open block longer than
+    max_block_chars is dropped, so a stray "{" cannot make the buffer grow.
+    """
+    carry = ""
+    for page_text in pages:
+        text = carry + page_text + "\n"
+        carry = ""
+        position = 0
+        while True:
+            start = text.find("{", position)
+            if start < 0:
+                break
+            end = text.find("}", start + 1)
+            if end < 0:
+                carry = text[start:]
+                if len(carry) > max_block_chars:
+                    log.debug("Dropping an unclosed block of %s characters.", len(carry))
+                    carry = ""
+                break
+            yield text[start + 1:end]
+            position = end + 1
+
+QUOTES = {'"': '"', '“': '”', "'": "'"}
+MAX_KEY_WORDS = 4  # Longest key outside search_dict; a bounded key keeps the scan linear in the block length
+
+@functools.lru_cache(maxsize=None)
+def compile_field_parser(search_dict):
+    """
+    One pattern per field set ("Área, Tipo, Nombre"), compiled once per process. It reads
+    every `key: value` pair of a block in a single scan: the expected keys plus any other
+    key of up to MAX_KEY_WORDS words right before its colon. A value ends at the next comma
+    or at the next expected key; quoted values may contain commas.
 
-    print(f"Searching for structured data within {{}}...")  # Debug
-    matches = re.findall(r"\{(.*?)\}", text)
+    Returns:
+        tuple: (expected fields, compiled pattern)
+    """
+    elements = tuple(element.strip() for element in search_dict.split(",") if element.strip())
+    known = "|".join(re.escape(element) for element in sorted(elements, key=len, reverse=True))
+    word = r"[^\s:,\"“”']+"
+    # Other keys never swallow an expected key: "texto Área:" is the key Área
+    other = rf"{word}(?:\s+(?!(?:{known})\s*:){word}){{0,{MAX_KEY_WORDS - 1}}}"
+    key = rf"(?<![^,\s])(?P<key>{known}|{other})"
+    # Unquoted values are read greedily; the expected-key lookahead only runs on whitespace
+    value = rf"(?P<value>\"[^\"]*\"(?=\s*(?:,|$))|“[^”]*”(?=\s*(?:,|$))|'[^']*'(?=\s*(?:,|$))|(?:[^,\s]+|\s(?!(?:{known})\s*:))*)"
+    return elements, re.compile(rf"{key}\s*:\s*{value}")
 
-    if not matches:
-        print("No structured data found in {} format.")  # Debug
+def parse_structured_block(block, pattern):
+    """Reads the `key: value` pairs of one block; the first non-empty value of a repeated key wins."""
+    fixed_text = fix_broken_lines(block)
+    log.debug("Found structured line: %s", fixed_text)
 
-    for match in matches:
-        fixed_text = fix_broken_lines(match)
-        print(f"Found structured line: {fixed_text}")  # Debug
+    values = {}
+    for key, value in pattern.findall(fixed_text):
+        if key in values:
+            continue
+        value = value.strip()
+        if value[:1] in QUOTES and len(value) >= 2 and value[-1] == QUOTES[value[0]]:
+            value = value[1:-1].strip()
+        if value:  # "Área:," has no value, as with the per-field search
+            values[key] = value
+    return values
+
+def extract_data_from_pages(pages, search_dict, max_blocks=None, extra_keys=False):
+    """
+    Parses the {...} blocks while the pages are read. With max_blocks, stops reading the
+    document once that many blocks had every expected field. Keys outside search_dict are
+    dropped unless extra_keys is set.
+    """
+    extracted_data = []
+    elements, pattern = compile_field_parser(search_dict)
+    complete_blocks = 0
 
-        values = {}
-        elements = search_dict.split(", ")
-        for element in elements:
-            pattern = rf"{element}:\s*([^,}}]+)"
-            match = re.search(pattern, fixed_text)
-            if match:
-                values[element] = match.group(1).strip()
-        
+    log.debug("Searching for structured data within {}...")
+    for block in iter_structured_blocks(pages):
+        values = parse_structured_block(block, pattern)
+        if not extra_keys:
+            values = {element: values[element] for element in elements if element in values}
         if values:
             extracted_data.append(values)
+            complete_blocks += all(element in values for element in elements)
+            if max_blocks and complete_blocks >= max_blocks:
+                log.debug("Found %s complete blocks, stopping early.", complete_blocks)
+                break
 
+    if not extracted_data:
+        log.debug("No structured data found in {} format.")
     return extracted_data
 
-def get_dicts(pdf_files, search_dict):
-    """Processes PDFs and extracts structured data."""
+def extract_data_from_textPYPDF(text, search_dict, extra_keys=False):
+    """Extracts data from text using search dictionary."""
+    return extract_data_from_pages([text], search_dict, extra_keys=extra_keys)
+
+def process_pdf(pdf_path, search_dict, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, max_pages=None, max_blocks=None,
+                extractor_order=DEFAULT_EXTRACTOR_ORDER, extra_keys=False, ocr=None):
+    """
+    Extracts and parses one PDF page by page. Runs inside the worker processes, so errors
+    are returned instead of raised and one bad file does not stop the others.
+
+    Returns:
+        tuple: (extracted data, error message or None, True if the pages came from the cache,
+        extraction stats)
+    """
+    stats = new_extraction_stats()
+    page_extractors = []
+
+    def texts(pages):
+        for _, text, extractor in pages:
+            page_extractors.append(extractor)
+            yield text
+
+    try:
+        pages, cached = open_page_stream(pdf_path, cache_dir, cache_max_bytes, max_pages, extractor_order, stats, ocr)
+        try:
+            extracted_data = extract_data_from_pages(texts(pages), search_dict, max_blocks, extra_keys)
+        finally:
+            pages.close()  # Closes the PDF (and discards a partial cache entry) when we stop early
+        log.debug("Extractor per page for %s: %s", pdf_path, page_extractors)
+        return extracted_data, None, cached, stats
+    except Exception as e:
+        return [], f"{type(e).__name__}: {e}", False, stats
+
+def log_extraction_stats(stats):
+    """One line per extractor: pages tried, time per page and pages where it found the text."""
+    for name in sorted(stats['tried']):
+        tried = stats['tried'][name]
+        seconds = stats['seconds'].get(name, 0)
+        log.info("%s: %s page(s) in %.2f s (%.1f ms/page), text found on %s",
+                 name, tried, seconds, 1000 * seconds / tried if tried else 0, stats['used'].get(name, 0))
+    if stats['used'].get('ocr-cache'):
+        log.info("%s scanned page(s) read from the OCR cache.", stats['used']['ocr-cache'])
+    if stats['used'].get('none'):
+        log.info("%s page(s) without text in any extractor.", stats['used']['none'])
+
+def get_dicts(pdf_files, search_dict, workers=1, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, max_pages=None, max_blocks=None,
+              extractor_order=DEFAULT_EXTRACTOR_ORDER, extra_keys=False, ocr=None, on_rows=None):
+    """
+    Processes PDFs and extracts structured data. With workers > 1 the files are extracted
+    in a process pool; the results keep the order of pdf_files. With cache_dir, only the
+    files whose contents are not in the extraction cache are parsed. max_pages and
+    max_blocks stop reading each file early (see extract_data_from_pages). extractor_order
+    is the per-page fallback order; extra_keys keeps the keys outside search_dict; ocr
+    (see OCR_DEFAULTS) reads the scanned pages with Tesseract. With on_rows, the rows of
+    every file are passed to on_rows(rows) as soon as that file is done (in order) instead
+    of being collected, and the returned list stays empty.
+    """
+    options = dict(cache_dir=cache_dir, cache_max_bytes=cache_max_bytes, max_pages=max_pages, max_blocks=max_blocks,
+                   extractor_order=tuple(extractor_order), extra_keys=extra_keys, ocr=ocr)
     dict_vals = []
+    failures = {}
 
-    print(f"Loading expected fields: {search_dict}")  # Debug
-    print(f"Starting the extraction process...")  # Debug
+    log.info("Loading expected fields: %s", search_dict)
+    log.info("Starting the extraction process...")
 
+    pdf_paths = {}
     for pdf_file in pdf_files:
         pdf_path = os.path.join(working_folder, 'Requisitos', pdf_file)
         if not os.path.exists(pdf_path):
-            print(f"Error: File not found {pdf_path}")  # Debug
+            log.error("File not found %s", pdf_path)
             continue
+        pdf_paths[pdf_file] = pdf_path
+
+    def iter_results():
+        if workers > 1 and len(pdf_paths) > 1:
+            log.info("Extracting %s files with %s worker processes.", len(pdf_paths), workers)
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=configure_logging, initargs=current_logging_config())
+            with executor:
+                futures = {pdf_file: executor.submit(process_pdf, pdf_path, search_dict, **options) for pdf_file, pdf_path in pdf_paths.items()}
+                for pdf_file, future in futures.items():
+                    try:
+                        yield pdf_file, future.result()
+                    except Exception as e:  # The worker process died
+                        yield pdf_file, ([], f"{type(e).__name__}: {e}", False, new_extraction_stats())
+        else:
+            for pdf_file, pdf_path in pdf_paths.items():
+                log.info("Processing file: %s", pdf_file)
+                yield pdf_file, process_pdf(pdf_path, search_dict, **options)
+
+    processed_files = 0
+    cached_files = 0
+    stats = new_extraction_stats()
+    for pdf_file, (extracted_data, error, cached, file_stats) in iter_results():
+        processed_files += 1
+        cached_files += cached
+        merge_extraction_stats(stats, file_stats)
+        if error:
+            failures[pdf_file] = error
+        elif extracted_data:
+            log.debug("Extracted data from %s: %s", pdf_file, extracted_data)
+        else:
+            log.warning("No data extracted from %s", pdf_file)
 
-        print(f"Processing file: {pdf_file}")  # Debug
-        text = extract_text_with_fallback(pdf_path)  # Use pdfplumber first, PyPDF2 as fallback
-        extracted_data = extract_data_from_textPYPDF(text, search_dict)
-        
-        if extracted_data:
-            print(f"Extracted data from {pdf_file}: {extracted_data}")  # Debug
+        if on_rows is not None:
+            on_rows(extracted_data)
         else:
-            print(f"No data extracted from {pdf_file}")  # Debug
+            dict_vals.extend(extracted_data)
 
-        dict_vals.extend(extracted_data)
+    if cache_dir:
+        log.info("%s file(s) read from the extraction cache, %s parsed.", cached_files, processed_files - cached_files)
+    log_extraction_stats(stats)
+    if failures:
+        log.error("Files that could not be processed:\n%s", "\n".join(f"- {pdf_file}: {error}" for pdf_file, error in failures.items()))
 
     return dict_vals
 
+OUTPUT_FORMATS = ('xlsx', 'csv', 'parquet')
+DEFAULT_OUTPUT_NAME = "Extracción"
+CSV_ENCODING = 'utf-8-sig'  # With BOM so Excel opens the accents correctly
+
+def output_format_for(file_path, output_format=None):
+    """The requested format, or the one of the file extension (Excel when it is not a known one)."""
+    if output_format:
+        return output_format
+    extension = os.path.splitext(file_path)[1].lower().lstrip('.')
+    return extension if extension in OUTPUT_FORMATS else 'xlsx'
+
 def dictionary_to_excel(dictionary, output_path):
     """Converts a list of dictionaries to an Excel file."""
     
@@ -119,38 +593,172 @@ def dictionary_to_excel(dictionary, output_path):
     
     # Check if the DataFrame is not empty
     if not output_df.empty:
-        print("✅ DataFrame created successfully!")
+        log.info("✅ DataFrame created successfully!")
 
     # Define the output file path
-    filename = "Extracción.xlsx"
+    filename = f"{DEFAULT_OUTPUT_NAME}.xlsx"
     file_path = os.path.join(output_path, filename)
 
     # Save to Excel
     output_df.to_excel(file_path, index=False)
 
-    print(f"✅ Excel file saved successfully at: {file_path}")
+    log.info("✅ Excel file saved successfully at: %s", file_path)
+
+def dictionary_to_file(dictionary, file_path, output_format=None):
+    """Writes the list of dictionaries as Excel, CSV or Parquet (see output_format_for)."""
+    output_format = output_format_for(file_path, output_format)
+    output_df = pd.DataFrame(dictionary)
+    if output_format == 'csv':
+        output_df.to_csv(file_path, index=False, encoding=CSV_ENCODING)
+    elif output_format == 'parquet':
+        output_df.astype('string').to_parquet(file_path, index=False)
+    else:
+        output_df.to_excel(file_path, index=False)
+    log.info("✅ %s rows saved at: %s", len(output_df), file_path)
+
+@contextlib.contextmanager
+def results_writer(file_path, columns, output_format=None):
+    """
+    Incremental output: yields write(rows), which appends the rows of one PDF to the file
+    right away, so the results are never held in memory all together. The columns are
+    fixed when the file is opened; other keys are dropped (the header is already written).
+    Excel goes through an openpyxl write-only workbook, saved when the block ends; CSV and
+    Parquet rows are on disk as soon as they are written.
+    """
+    output_format = output_format_for(file_path, output_format)
+    columns = list(columns)
+    written = [0]
+    dropped = set()
+
+    def as_rows(rows):
+        for row in rows:
+            dropped.update(key for key in row if key not in columns)
+            yield [row.get(column) for column in columns]
+
+    with contextlib.ExitStack() as stack:
+        if output_format == 'csv':
+            file = stack.enter_context(open(file_path, 'w', newline='', encoding=CSV_ENCODING))
+            writer = csv.writer(file)
+            writer.writerow(columns)
+
+            def write(rows):
+                for values in as_rows(rows):
+                    writer.writerow(values)
+                    written[0] += 1
+                file.flush()
+        elif output_format == 'parquet':
+            schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+            writer = stack.enter_context(pyarrow.parquet.ParquetWriter(file_path, schema))
+
+            def write(rows):
+                values = list(as_rows(rows))
+                if values:
+                    writer.write_table(pyarrow.Table.from_pylist([dict(zip(columns, row)) for row in values], schema=schema))
+                    written[0] += len(values)
+        else:
+            import openpyxl
+            workbook = openpyxl.Workbook(write_only=True)
+            sheet = workbook.create_sheet()
+            sheet.append(columns)
+            stack.callback(lambda: workbook.save(file_path))
+
+            def write(rows):
+                for values in as_rows(rows):
+                    sheet.append(values)
+                    written[0] += 1
+
+        yield write
+
+    if dropped:
+        log.warning("Columns not written in incremental mode: %s", ", ".join(sorted(dropped)))
+    log.info("✅ %s rows saved at: %s", written[0], file_path)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extrae los requisitos {Área, Tipo, Nombre} de los PDF en Requisitos/.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes used to extract the PDFs (0 = one per CPU, default: 1).")
+    parser.add_argument('--no-cache', action='store_true', help="Extract every PDF again instead of using the extraction cache.")
+    parser.add_argument('--cache-dir', help="Extraction cache folder (default: Requisitos/.extraccion_cache).")
+    parser.add_argument('--cache-size-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Size limit of the extraction cache; the least recently used entries are evicted (default: %(default)s).")
+    parser.add_argument('--max-pages', type=int, help="Read at most this many pages of each PDF.")
+    parser.add_argument('--max-blocks', type=int,
+                        help="Stop reading a PDF once this many {...} blocks had every expected field.")
+    parser.add_argument('--primary-extractor', choices=list(PAGE_EXTRACTORS), default=DEFAULT_EXTRACTOR_ORDER[0],
+                        help="Extractor tried first on every page; the other one only reads the pages it leaves empty (default: %(default)s).")
+    parser.add_argument('--extra-keys', action='store_true',
+                        help="Also export the keys found in the {...} blocks that are not Área, Tipo or Nombre.")
+    ocr = parser.add_argument_group('OCR', "Scanned pages (no text layer), needs pytesseract and tesseract.")
+    ocr.add_argument('--ocr', action='store_true', help="Read the pages without text with Tesseract.")
+    ocr.add_argument('--ocr-dpi', type=int, default=OCR_DEFAULTS['dpi'], help="Rasterization resolution (default: %(default)s).")
+    ocr.add_argument('--ocr-lang', default=OCR_DEFAULTS['lang'], help="Tesseract language(s), e.g. spa+eng (default: %(default)s).")
+    ocr.add_argument('--ocr-workers', type=int, default=OCR_DEFAULTS['workers'],
+                     help="Pages OCRed in parallel per PDF (0 = one per CPU, default: %(default)s).")
+    ocr.add_argument('--ocr-cache-dir', help="OCR cache folder, by page fingerprint (default: Requisitos/.ocr_cache).")
+    output = parser.add_argument_group('output')
+    output.add_argument('--output', help="Results file (default: Requisitos/Extracción.<format>).")
+    output.add_argument('--format', choices=OUTPUT_FORMATS,
+                        help="Output format; by default taken from the --output extension, otherwise xlsx.")
+    output.add_argument('--incremental', action='store_true',
+                        help="Write the rows of every PDF as soon as it is extracted instead of all at the end.")
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    configure_from_args(args)
+
     pdf_folder = os.path.join(working_folder, 'Requisitos')
     
     if not os.path.exists(pdf_folder):
-        print(f"Error: Folder {pdf_folder} does not exist.")  # Debug
+        log.error("Folder %s does not exist.", pdf_folder)
         return
 
-    print(f"PDF folder found: {pdf_folder}")  # Debug
+    log.info("PDF folder found: %s", pdf_folder)
 
-    pdf_files = [file for file in os.listdir(pdf_folder) if file.endswith(".pdf")]
+    pdf_files = sorted(file for file in os.listdir(pdf_folder) if file.endswith(".pdf"))
     
     if not pdf_files:
-        print("No PDF files found in the folder.")  # Debug
+        log.error("No PDF files found in the folder.")
         return
 
-    print(f"Found PDF files: {pdf_files}")  # Debug
+    log.info("Found %s PDF files.", len(pdf_files))
+    log.debug("Found PDF files: %s", pdf_files)
 
     search_dict = "Área, Tipo, Nombre"
-    requisitos = get_dicts(pdf_files, search_dict)
-    dictionary_to_excel(requisitos, pdf_folder)
-    print(f"Final extracted data: {requisitos}")  # Debug
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    cache_dir = None if args.no_cache else (args.cache_dir or os.path.join(pdf_folder, '.extraccion_cache'))
+    ocr = None
+    if args.ocr:
+        if not ocr_available():
+            log.error("OCR requested but pytesseract/tesseract are not available (pip install pytesseract and install Tesseract).")
+            return
+        ocr = dict(OCR_DEFAULTS, dpi=args.ocr_dpi, lang=args.ocr_lang,
+                   workers=args.ocr_workers if args.ocr_workers > 0 else (os.cpu_count() or 1),
+                   cache_dir=args.ocr_cache_dir or os.path.join(pdf_folder, '.ocr_cache'),
+                   cache_max_bytes=args.cache_size_mb * 1024 * 1024)
+    output_format = args.format or output_format_for(args.output or "")
+    output_file = args.output or os.path.join(pdf_folder, f"{DEFAULT_OUTPUT_NAME}.{output_format}")
+    if output_format == 'parquet' and pyarrow is None:
+        log.error("Parquet output needs pyarrow (pip install pyarrow).")
+        return
+
+    options = dict(workers=workers, cache_dir=cache_dir, cache_max_bytes=args.cache_size_mb * 1024 * 1024,
+                   max_pages=args.max_pages, max_blocks=args.max_blocks,
+                   extractor_order=[args.primary_extractor] + [name for name in PAGE_EXTRACTORS if name != args.primary_extractor],
+                   extra_keys=args.extra_keys, ocr=ocr)
+    if args.incremental:
+        columns, _ = compile_field_parser(search_dict)
+        with results_writer(output_file, columns, output_format) as write:
+            get_dicts(pdf_files, search_dict, on_rows=write, **options)
+        return
+
+    requisitos = get_dicts(pdf_files, search_dict, **options)
+    if args.output is None and output_format == 'xlsx':
+        dictionary_to_excel(requisitos, pdf_folder)
+    else:
+        dictionary_to_file(requisitos, output_file, output_format)
+    log.debug("Final extracted data: %s", requisitos)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,4 +1,9 @@
 import os
+import argparse
+import csv
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from PyPDF2 import PdfReader, PdfWriter
 #import xlsxwriter
 import sys
@@ -7,21 +12,49 @@ script_directory = os.path.dirname(os.path.abspath(__file__))
 working_folder = os.path.abspath(os.path.join(script_directory, '..'))
 function_library = os.path.abspath(os.path.join(script_directory, 'Library'))
 sys.path.append(function_library)  # Add the library folder to the path.
+from logging_setup import get_logger, add_logging_arguments, configure_from_args
+from pdf_tools import dedupe_identical_objects, page_index_map, iter_outline, destination_page_index
+
+log = get_logger('split')
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Divide Cartas_updated.pdf por marcadores usando los nombres de Bookmarks.md.")
+    parser.add_argument('--manifest',
+                        help="CSV/JSON with source, output, and pages / start,end / bookmark per row: cuts any number of "
+                             "PDFs into page ranges instead of using Bookmarks.md.")
+    parser.add_argument('--output-folder', help="Folder for the split files (default: output/ in the working folder).")
+    parser.add_argument('--depth', type=int, default=1,
+                        help="Outline levels that start a section: 1 = top-level bookmarks only (default), 2 = also their children...")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Section files written at the same time (0 = one per CPU, default: 1).")
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
 
 
 def main():
+    args = parse_args()
+    configure_from_args(args)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    output_folder = args.output_folder or os.path.join(working_folder, 'output')
+
+    if args.manifest:
+        os.makedirs(output_folder, exist_ok=True)
+        split_by_manifest(load_manifest(args.manifest), output_folder, jobs=jobs)
+        return
+
     # Step 1: Get user input for PDF file name (without extension)
     pdf_name = 'Cartas_updated'  # Example PDF name
     pdf_path = os.path.join(working_folder, f'{pdf_name}.pdf')  # Use an f-string to inject pdf_name
-    print(f"PDF path: {pdf_path}")
+    log.info("PDF path: %s", pdf_path)
     # Step 2: Verify the PDF file exists
     if not os.path.isfile(pdf_path):
-        print(f"The file '{pdf_path}' does not exist.")
+        log.error("The file '%s' does not exist.", pdf_path)
         return
 
     # Step 3: Load PDF and get bookmarks
     pdf = PdfReader(pdf_path)
-    bookmarks = pdf.outline
+    bookmarks = list(iter_outline(pdf.outline, args.depth))  # Nested entries come as lists, they are not bookmarks of this level
 
     # Step 4: Get the user-provided bookmark names
     #user_bookmark_names = input("Enter the bookmark names separated by '|': ").split('|')
@@ -30,26 +63,25 @@ def main():
     user_bookmark_names = load_bookmarks(md_file)
 
     if user_bookmark_names:
-        print("Bookmarks loaded successfully:")
+        log.info("Bookmarks loaded successfully:")
         for i, bookmark in enumerate(user_bookmark_names, start=1):
-            print(f"{i}. {bookmark}")
+            log.info("%s. %s", i, bookmark)
     else:
-        print("No bookmarks found or the file is empty.")    
+        log.warning("No bookmarks found or the file is empty.")
     user_bookmark_names = [name.strip() for name in user_bookmark_names if name.strip()]  # Clean input
 
     # Step 5: Validate the number of bookmarks
     if len(bookmarks) != len(user_bookmark_names):
-        print(f"Mismatch: The PDF has {len(bookmarks)} bookmarks, but you provided {len(user_bookmark_names)} names.")
+        log.error("Mismatch: The PDF has %s bookmarks, but you provided %s names.", len(bookmarks), len(user_bookmark_names))
         return
     
     # Ensure the output folder exists
-    output_folder = os.path.join(working_folder,'output')
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
 
-    # Step 6: Call the split function with the new filenames
-    split_pdf_by_bookmarks(pdf_path, output_folder, user_bookmark_names)
-    print("PDF split by bookmarks and saved with the specified names.")
+    # Step 6: Call the split function with the new filenames (same reader, the PDF is parsed once)
+    split_pdf_by_bookmarks(pdf, output_folder, user_bookmark_names, jobs=jobs, depth=args.depth)
+    log.info("PDF split by bookmarks and saved with the specified names.")
 
 
 def load_bookmarks(file_path):
@@ -63,7 +95,7 @@ def load_bookmarks(file_path):
         list: A list of bookmark names.
     """
     if not os.path.exists(file_path):
-        print(f"Error: The file '{file_path}' does not exist.")
+        log.error("The file '%s' does not exist.", file_path)
         return []
 
     with open(file_path, 'r', encoding='utf-8') as file:
@@ -75,66 +107,194 @@ def load_bookmarks(file_path):
 
 
 
+def resolve_sections(pdf, bookmark_names, depth=1):
+    """
+    Resolves every bookmark page in one pass over the outline, down to `depth` levels,
+    with a page index map built once for the document. bookmark_names follow the order
+    of the outline.
+
+    Returns:
+        list: (file title, first page index, end page index) for every section; a section
+        ends where the next one starts, the last one at the end of the document.
+    """
+    index_map = page_index_map(pdf)
+    starts = []
+    for i, (_, bookmark) in enumerate(iter_outline(pdf.outline, depth)):
+        starts.append((sanitize_filename(bookmark_names[i]), find_page_index(pdf, bookmark, index_map)))  # Use user-defined name
+    ends = [page_index for _, page_index in starts[1:]] + [len(pdf.pages)]
+    return [(title, start, end) for (title, start), end in zip(starts, ends)]
+
+def build_writer(pdf, page_indices):
+    """PdfWriter with the given pages of pdf, in that order; identical fonts/images are stored once."""
+    pdf_writer = PdfWriter()
+    for j in page_indices:
+        pdf_writer.add_page(pdf.pages[j])
+    removed = dedupe_identical_objects(pdf_writer)
+    if removed:
+        log.debug("%s duplicated objects merged.", removed)
+    return pdf_writer
+
+def write_pdf(pdf_writer, output_path):
+    with open(output_path, "wb") as f_out:
+        pdf_writer.write(f_out)
+    return output_path
+
+def write_outputs(pdf, outputs, jobs=1):
+    """
+    Writes (output path, page indices) pairs from one open reader. The pages are always
+    copied from the reader in order (PdfReader is not thread safe); with jobs > 1 only the
+    writing of the finished files overlaps.
+    """
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = []
+        for output_path, page_indices in outputs:
+            pdf_writer = build_writer(pdf, page_indices)
+            if jobs > 1:
+                futures.append(executor.submit(write_pdf, pdf_writer, output_path))
+            else:
+                write_pdf(pdf_writer, output_path)
+        for future in futures:
+            future.result()  # Re-raises a failed write
+
 # Updated split function to accept custom names
-def split_pdf_by_bookmarks(path_to_pdf, output_folder, bookmark_names):
-    pdf = PdfReader(path_to_pdf)
-    bookmarks = pdf.outline
-    prev_bookmark_title = None
-    prev_bookmark_page_index = None
-    #root_folder = ".\\"
-    # Prepare Excel output
-    #workbook = xlsxwriter.Workbook(os.path.join(root_folder, 'Bookmarks_exported.xlsx'))
-    #worksheet = workbook.add_worksheet()
-    #worksheet.write(0, 0, 'PDF File Name')
-    #ow = 1  # Start writing PDF names in Excel from row 1
-
-    # Iterate through bookmarks
-    for i, bookmark in enumerate(bookmarks):
-        if hasattr(bookmark, 'title'):
-            page_index = find_page_index(pdf, bookmark)
-            title = sanitize_filename(bookmark_names[i])  # Use user-defined name
-            
-            if prev_bookmark_title is not None:
-                pdf_writer = PdfWriter()
-                for j in range(prev_bookmark_page_index, page_index):
-                    pdf_writer.add_page(pdf.pages[j])
-                output_path = os.path.join(output_folder, f"{prev_bookmark_title}.pdf")
-                with open(output_path, "wb") as f_out:
-                    pdf_writer.write(f_out)
-                
-                # Save file name to Excel
-                #worksheet.write(row, 0, f"{prev_bookmark_title}.pdf")
-                #row += 1
-
-            prev_bookmark_title = title
-            prev_bookmark_page_index = page_index
-
-    # Write the last section
-    if prev_bookmark_title is not None:
-        pdf_writer = PdfWriter()
-        for j in range(prev_bookmark_page_index, len(pdf.pages)):
-            pdf_writer.add_page(pdf.pages[j])
-        output_path = os.path.join(output_folder, f"{prev_bookmark_title}.pdf")
-        with open(output_path, "wb") as f_out:
-            pdf_writer.write(f_out)
-
-        # Save last PDF name to Excel
-        #worksheet.write(row, 0, f"{prev_bookmark_title}.pdf")
-
-    #workbook.close()
-    print("All bookmarks have been split and saved.")
+def split_pdf_by_bookmarks(path_to_pdf, output_folder, bookmark_names, jobs=1, depth=1):
+    """
+    Writes one PDF per top-level bookmark, named after bookmark_names.
+
+    Args:
+        path_to_pdf (str | PdfReader): Source PDF, or a reader already open on it.
+        output_folder (str): Folder for the section files.
+        bookmark_names (list): One output name per bookmark.
+        jobs (int): Section files written at the same time (see write_outputs).
+        depth (int): Outline levels that start a section (see resolve_sections).
+    """
+    pdf = path_to_pdf if isinstance(path_to_pdf, PdfReader) else PdfReader(path_to_pdf)
+    sections = resolve_sections(pdf, bookmark_names, depth)
+
+    write_outputs(pdf, ((os.path.join(output_folder, f"{title}.pdf"), range(start, end)) for title, start, end in sections), jobs)
+
+    log.info("All bookmarks have been split and saved.")
+
+def load_manifest(file_path):
+    """
+    Reads the split manifest, a CSV (header row) or a JSON list of objects with:
+
+        source    PDF to cut, relative to the working folder (default: Cartas_updated.pdf)
+        output    Name of the file to write
+        pages     Page ranges, 1-based: "1-5, 8, 12-" (12 to the end)
+        start/end First and last page (1-based, inclusive), instead of pages
+        bookmark  Outline title; the range goes until the next entry of the same or a
+                  higher level
+
+    Ranges may overlap and several rows may cut the same source.
+
+    Returns:
+        list: One dictionary per output, with its place in the file under '_position':
+        ('row', N) in a CSV (the header is row 1) or ('entry', N) in a JSON list (from 1).
+    """
+    if file_path.lower().endswith('.json'):
+        with open(file_path, 'r', encoding='utf-8') as file:
+            numbered = [('entry', number, entry) for number, entry in enumerate(json.load(file), start=1)]
+    else:
+        with open(file_path, 'r', newline='', encoding='utf-8-sig') as file:
+            numbered = [('row', number, entry) for number, entry in enumerate(csv.DictReader(file), start=2)]
+    manifest = []
+    for unit, number, entry in numbered:
+        entry = {key.strip().lower(): str(value).strip() for key, value in entry.items() if key and value not in (None, "")}
+        entry['_position'] = (unit, number)
+        manifest.append(entry)
+    return manifest
+
+def parse_page_ranges(spec, page_count):
+    """'1-3, 7, 10-' -> [0, 1, 2, 6, 9, ..., page_count - 1] (0-based page indices)."""
+    page_indices = []
+    for part in spec.replace(';', ',').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        first, separator, last = part.partition('-')
+        start = int(first) if first.strip() else 1
+        end = (int(last) if last.strip() else page_count) if separator else start
+        if not 1 <= start <= end <= page_count:
+            raise ValueError(f"Page range '{part}' outside 1-{page_count}.")
+        page_indices.extend(range(start - 1, end))
+    return page_indices
+
+def bookmark_ranges(pdf):
+    """{outline title: (first page index, end page index)} for every outline entry, nested ones included."""
+    index_map = page_index_map(pdf)
+    entries = [(level, bookmark.title, find_page_index(pdf, bookmark, index_map))
+               for level, bookmark in iter_outline(pdf.outline, depth=None)]
+    ranges = {}
+    for i, (level, title, start) in enumerate(entries):
+        end = next((page_index for next_level, _, page_index in entries[i + 1:] if next_level <= level), len(pdf.pages))
+        ranges.setdefault(title.strip(), (start, max(end, start + 1)))
+    return ranges
+
+def manifest_pages(entry, pdf, get_bookmarks):
+    if 'pages' in entry:
+        return parse_page_ranges(entry['pages'], len(pdf.pages))
+    if 'start' in entry or 'end' in entry:
+        return parse_page_ranges(f"{entry.get('start', '')}-{entry.get('end', '')}", len(pdf.pages))
+    if 'bookmark' in entry:
+        ranges = get_bookmarks()
+        if entry['bookmark'] not in ranges:
+            raise ValueError(f"Bookmark '{entry['bookmark']}' not found.")
+        return range(*ranges[entry['bookmark']])
+    raise ValueError("The row needs pages, start/end or bookmark.")
+
+def split_by_manifest(entries, output_folder, jobs=1):
+    """
+    Manifest split (see load_manifest): the rows are grouped by source, every source is
+    read once and all its outputs are cut from that reader. A bad row is reported and
+    skipped.
+    """
+    by_source = OrderedDict()
+    for index, entry in enumerate(entries):
+        unit, number = entry.get('_position', ('entry', index + 1))
+        by_source.setdefault(entry.get('source', 'Cartas_updated.pdf'), []).append((index, f"{unit} {number}", number, entry))
+
+    written, failures = 0, []
+    for source, rows in by_source.items():
+        source_path = source if os.path.isabs(source) else os.path.join(working_folder, source)
+        if not os.path.isfile(source_path):
+            failures.extend((index, position, f"{source} does not exist") for index, position, _, _ in rows)
+            continue
+        log.info("Splitting %s into %s file(s).", source, len(rows))
+        pdf = PdfReader(source_path)
+        bookmarks = {}
+
+        def get_bookmarks():
+            if not bookmarks:
+                bookmarks.update(bookmark_ranges(pdf))
+            return bookmarks
+
+        outputs = []
+        for index, position, number, entry in rows:
+            try:
+                name = entry.get('output') or f"{os.path.splitext(os.path.basename(source))[0]} {number}"
+                name = sanitize_filename(name[:-4] if name.lower().endswith('.pdf') else name)
+                outputs.append((os.path.join(output_folder, f"{name}.pdf"), manifest_pages(entry, pdf, get_bookmarks)))
+            except ValueError as e:
+                failures.append((index, position, f"{source}: {e}"))
+        write_outputs(pdf, outputs, jobs)
+        written += len(outputs)
+
+    log.info("%s file(s) written to %s", written, output_folder)
+    if failures:
+        log.error("Manifest rows not written:\n%s", "\n".join(f"- {position}: {error}" for _, position, error in sorted(failures)))
 
 def sanitize_filename(name):
     # Remove any characters that could cause issues in filenames
     return "".join(c for c in name if c.isalnum() or c in (" ", "-", "_")).rstrip()
 
-def find_page_index(pdf, bookmark):
-    # Retrieve page index from bookmark reference
-    try:
-        return pdf.get_page_number(bookmark.page) if hasattr(bookmark, 'page') else 0
-    except Exception as e:
-        print(f"Error retrieving page index for bookmark: {bookmark}. Error: {e}")
+def find_page_index(pdf, bookmark, index_map=None):
+    # Retrieve page index from bookmark reference (index_map: see page_index_map, avoids a scan of the pages per bookmark)
+    page_index = destination_page_index(pdf, bookmark, index_map)
+    if page_index is None:
+        log.error("Error retrieving page index for bookmark: %s", bookmark)
         return 0
+    return page_index
 
 # Run the main function
 if __name__ == "__main__":
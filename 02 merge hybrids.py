@@ -1,10 +1,26 @@
 import os
+import sys
+import json
 import shutil
+import argparse
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from PyPDF2 import PdfMerger
+from PyPDF2 import PdfReader, PdfWriter
 
 script_directory = os.path.dirname(os.path.abspath(__file__))
 working_folder = os.path.abspath(os.path.join(script_directory, '..'))
+function_library = os.path.abspath(os.path.join(script_directory, 'Library'))
+sys.path.append(function_library)  # Add the library folder to the path.
+from logging_setup import get_logger, add_logging_arguments, configure_from_args
+from pdf_tools import dedupe_identical_objects
+from disk_cache import file_digest
+from path_expr import evaluate_path, validate_expressions
+
+log = get_logger('hybrids')
+
+PATH_NAMES = {'working_folder': working_folder, 'script_directory': script_directory}  # Names the sheet paths may use
 
 def create_dictionaries(df):
     """
@@ -15,69 +31,232 @@ def create_dictionaries(df):
         header = df.iloc[0, column]  # Header as the key
         files_to_merge = df.iloc[1:, column].dropna().tolist()  # Files below as the list
         header_dicts[header] = files_to_merge
-    print("Created Dictionaries:")  # Debugging statement
+    log.debug("Created Dictionaries:")
     for header, files in header_dicts.items():
-        print(f"{header}: {files}")
+        log.debug("%s: %s", header, files)
     return header_dicts
 
-def process_dictionaries(header_dicts, output_folder):
+def resolve_path(file_path):
+    """Evaluates the os.path.join(...) expressions of the sheet (see path_expr); plain paths are returned as they are."""
+    return evaluate_path(file_path, PATH_NAMES)
+
+def plan_merges(header_dicts, output_folder):
+    """
+    Resolves every path once and decides what to do with each hybrid.
+
+    Returns:
+        list: (header, output path, existing input paths, missing input paths) per hybrid.
+    """
+    plan = []
+    for header, files in header_dicts.items():
+        paths = [resolve_path(file_path) for file_path in files]
+        existing = [path for path in paths if os.path.exists(path)]
+        missing = [path for path in paths if not os.path.exists(path)]
+        plan.append((header, os.path.join(output_folder, header), existing, missing))
+    return plan
+
+DEFAULT_SOURCE_CACHE = 64
+
+def open_source_cache(max_sources=DEFAULT_SOURCE_CACHE):
+    """
+    Bounded LRU of parsed source PDFs, so a carta used by dozens of hybrids is parsed once.
+
+    Returns:
+        tuple: (get(path) -> PdfReader, stats dict with the number of 'parsed' and 'reused' sources)
+    """
+    readers = OrderedDict()
+    stats = {'parsed': 0, 'reused': 0}
+
+    def get(path):
+        if path in readers:
+            readers.move_to_end(path)
+            stats['reused'] += 1
+            return readers[path]
+        reader = PdfReader(path)
+        stats['parsed'] += 1
+        readers[path] = reader
+        if len(readers) > max_sources:
+            readers.popitem(last=False)
+        return reader
+
+    return get, stats
+
+def assemble_hybrid(paths, get_reader):
+    """PdfWriter with every page (and bookmarks) of paths, in order; identical fonts/images are stored once."""
+    writer = PdfWriter()
+    for path in paths:
+        writer.append(get_reader(path))
+    dedupe_identical_objects(writer)
+    return writer
+
+def write_hybrid(writer, merged_file_path):
+    with open(merged_file_path, "wb") as f_out:
+        writer.write(f_out)
+    return merged_file_path
+
+# Build manifest: inputs of every hybrid of the last run, to rebuild only what changed (like make)
+BUILD_MANIFEST = '.build_manifest.json'
+BUILD_MANIFEST_VERSION = 1
+
+def load_build_manifest(output_folder):
+    """{hybrid name: record} of the last run; empty when there is none or it cannot be read."""
+    manifest_path = os.path.join(output_folder, BUILD_MANIFEST)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        log.warning("Ignoring unreadable build manifest %s: %s", manifest_path, e)
+        return {}
+    if manifest.get('version') != BUILD_MANIFEST_VERSION:
+        return {}
+    return manifest.get('outputs', {})
+
+def save_build_manifest(output_folder, outputs):
+    """Writes the manifest through a temporary file, so an interrupted run never leaves it half written."""
+    fd, tmp_path = tempfile.mkstemp(dir=output_folder, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as file:
+        json.dump({'version': BUILD_MANIFEST_VERSION, 'outputs': outputs}, file, ensure_ascii=False, indent=1)
+    os.replace(tmp_path, os.path.join(output_folder, BUILD_MANIFEST))
+
+def _file_state(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def input_signatures(paths, previous_inputs=(), use_hash=False):
     """
-    Process each dictionary: try to find and merge files, save merged output.
+    Path, size and mtime of every input, in order. With use_hash also the SHA-256 of the
+    contents; it is only computed again when size or mtime changed since the last run.
+    """
+    previous = {entry['path']: entry for entry in previous_inputs}
+    signatures = []
+    for path in paths:
+        signature = dict(path=path, **_file_state(path))
+        if use_hash:
+            old = previous.get(path, {})
+            same_file = (old.get('size'), old.get('mtime_ns')) == (signature['size'], signature['mtime_ns'])
+            signature['sha256'] = old['sha256'] if same_file and 'sha256' in old else file_digest(path)
+        signatures.append(signature)
+    return signatures
+
+def is_up_to_date(record, merged_file_path, signatures, use_hash=False):
+    """
+    True when the output exists as it was written and its inputs are the same files, in
+    the same order, unchanged: same size and mtime, or same SHA-256 with use_hash (a
+    touched but identical file does not trigger a rebuild).
+    """
+    if not record or not os.path.exists(merged_file_path) or record.get('output') != _file_state(merged_file_path):
+        return False
+    recorded = record.get('inputs', [])
+    if [entry['path'] for entry in recorded] != [entry['path'] for entry in signatures]:
+        return False
+    for old, new in zip(recorded, signatures):
+        # Records written without use_hash have no SHA-256 yet: fall back to the mtime
+        field = 'sha256' if use_hash and 'sha256' in old else 'mtime_ns'
+        if old.get('size') != new['size'] or old.get(field) != new[field]:
+            return False
+    return True
+
+def process_dictionaries(header_dicts, output_folder, jobs=1, max_sources=DEFAULT_SOURCE_CACHE, incremental=True, use_hash=False):
+    """
+    Process each dictionary: try to find and merge files, save merged output. Every
+    distinct source PDF is parsed once (see open_source_cache) and the hybrids are
+    assembled from those readers; with jobs > 1 the finished hybrids are written in
+    parallel. With incremental, the hybrids whose inputs did not change since the last
+    run (see BUILD_MANIFEST and is_up_to_date) are not built again.
     """
     os.makedirs(output_folder, exist_ok=True)
     missing_files_by_header = {}  # To track missing files for each header
-    
-    for header, files in header_dicts.items():
-        merged_file_path = os.path.join(output_folder, header)
-        missing_files = []  # Track missing files for the current header
-        
-        if len(files) == 1:
-            # If there's only one file, copy it to the output folder
-            single_file_path = eval(files[0]) if 'os.path.join' in files[0] else files[0]
-            if os.path.exists(single_file_path):
-                shutil.copy(single_file_path, merged_file_path)
-                print(f"Copied {single_file_path} to {merged_file_path}")
+    get_reader, source_stats = open_source_cache(max_sources)
+    previous_manifest = load_build_manifest(output_folder) if incremental else {}
+    build_manifest = {}
+    up_to_date = 0
+
+    def record_build(header, merged_file_path, signatures):
+        build_manifest[header] = {'inputs': signatures, 'output': _file_state(merged_file_path)}
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        writes = []
+        for header, merged_file_path, existing, missing_files in plan_merges(header_dicts, output_folder):
+            for path in missing_files:
+                log.warning("File %s does not exist. Skipping.", path)
+
+            signatures = None
+            if existing and not missing_files:
+                signatures = input_signatures(existing, previous_manifest.get(header, {}).get('inputs', ()), use_hash)
+                if incremental and is_up_to_date(previous_manifest.get(header), merged_file_path, signatures, use_hash):
+                    log.debug("%s is up to date.", header)
+                    record_build(header, merged_file_path, signatures)
+                    up_to_date += 1
+                    continue
+
+            if len(existing) + len(missing_files) == 1:
+                # If there's only one file, copy it to the output folder
+                if existing:
+                    shutil.copy(existing[0], merged_file_path)
+                    record_build(header, merged_file_path, signatures)
+                    log.info("Copied %s to %s", existing[0], merged_file_path)
+            elif len(existing) + len(missing_files) > 1:
+                # If there are multiple files, merge them (only when none is missing)
+                if not missing_files:
+                    try:
+                        writer = assemble_hybrid(existing, get_reader)
+                        if jobs > 1:
+                            writes.append((header, merged_file_path, signatures, executor.submit(write_hybrid, writer, merged_file_path)))
+                        else:
+                            write_hybrid(writer, merged_file_path)
+                            record_build(header, merged_file_path, signatures)
+                            log.info("File successfully merged: %s", os.path.join(*merged_file_path.split(os.sep)[-2:]))
+                    except Exception as e:
+                        log.error("Error while merging files for %s: %s", header, e)
             else:
-                print(f"File {single_file_path} does not exist. Skipping.")
-                missing_files.append(single_file_path)
-        elif len(files) > 1:
-            # If there are multiple files, merge them
-            merger = PdfMerger()
+                log.warning("No files found for header %s. Skipping.", header)
+
+            # Add missing files to the tracking dictionary
+            if missing_files:
+                missing_files_by_header[header] = missing_files
+
+        for header, merged_file_path, signatures, future in writes:
             try:
-                for file_path in files:
-                    evaluated_path = eval(file_path) if 'os.path.join' in file_path else file_path
-                    if os.path.exists(evaluated_path):
-                        merger.append(evaluated_path)
-                    else:
-                        print(f"File {evaluated_path} does not exist. Skipping.")
-                        missing_files.append(evaluated_path)
-                # Write the merged file
-                if not missing_files:
-                    merger.write(merged_file_path)
-                    print(f"\n********\nFile successfully merged \n{os.path.join(*merged_file_path.split(os.sep)[-2:])}\n*************\n")
+                future.result()
+                record_build(header, merged_file_path, signatures)
+                log.info("File successfully merged: %s", os.path.join(*merged_file_path.split(os.sep)[-2:]))
             except Exception as e:
-                print(f"Error while merging files for {header}: {e}")
-            finally:
-                merger.close()
-        else:
-            print(f"No files found for header {header}. Skipping.")
-        
-        # Add missing files to the tracking dictionary
-        if missing_files:
-            missing_files_by_header[header] = missing_files
-    
+                log.error("Error while merging files for %s: %s", header, e)
+
+    save_build_manifest(output_folder, build_manifest)
+    if incremental:
+        log.info("%s hybrid(s) up to date, %s rebuilt.", up_to_date, len(build_manifest) - up_to_date)
+    log.info("%s source PDF(s) parsed, %s reused from the cache.", source_stats['parsed'], source_stats['reused'])
+
     # Provide summary feedback
     if not missing_files_by_header:
-        print("\n******\n Not a single file is missing.\n*********+")
+        log.info("Not a single file is missing.")
     else:
-        print("\nMissing files:")
+        lines = []
         for header, files in missing_files_by_header.items():
-            print(f"{header}:")
+            lines.append(f"{header}:")
             for file in files:
-                print(f"  - {os.path.join(*file.split(os.sep)[-2:])}")
-                #print(f"  - {file}")
+                lines.append(f"  - {os.path.join(*file.split(os.sep)[-2:])}")
+        log.warning("Missing files:\n%s", "\n".join(lines))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Genera los PDF híbridos de la hoja 'Hybrids' de Cartas.xlsx.")
+    parser.add_argument('--jobs', type=int, default=1,
+                        help="Hybrids written at the same time (0 = one per CPU, default: 1).")
+    parser.add_argument('--max-sources', type=int, default=DEFAULT_SOURCE_CACHE,
+                        help="Parsed source PDFs kept in memory (default: %(default)s).")
+    parser.add_argument('--force', action='store_true', help="Rebuild every hybrid, even the ones whose inputs did not change.")
+    parser.add_argument('--hash', action='store_true',
+                        help="Compare the inputs by content (SHA-256) instead of size and modification time.")
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
 
 def main():
+    args = parse_args()
+    configure_from_args(args)
+
     # Define paths
     excel_file = os.path.join(working_folder, 'Cartas.xlsx')
     output_folder = os.path.join(working_folder, 'Híbridos')
@@ -86,12 +265,18 @@ def main():
     try:
         df = pd.read_excel(excel_file, sheet_name='Hybrids', header=None)
     except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        log.error("Error reading Excel file: %s", e)
         return
     
     # Create dictionaries and process
     header_dicts = create_dictionaries(df)
-    process_dictionaries(header_dicts, output_folder)
+    errors = validate_expressions((file_path for files in header_dicts.values() for file_path in files), PATH_NAMES)
+    if errors:
+        log.error("Invalid paths in the 'Hybrids' sheet:\n%s", "\n".join(f"- {expression}: {error}" for expression, error in errors.items()))
+        return
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    process_dictionaries(header_dicts, output_folder, jobs=jobs, max_sources=args.max_sources,
+                         incremental=not args.force, use_hash=args.hash)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
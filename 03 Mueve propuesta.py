@@ -1,10 +1,25 @@
 
 import os
+import sys
 import shutil
+import argparse
+import collections
+import errno
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 
 script_directory = os.path.dirname(os.path.abspath(__file__))
 working_folder = os.path.abspath(os.path.join(script_directory, '..'))
+function_library = os.path.abspath(os.path.join(script_directory, 'Library'))
+sys.path.append(function_library)  # Add the library folder to the path.
+from logging_setup import get_logger, add_logging_arguments, configure_from_args
+from path_expr import evaluate_path, validate_expressions
+from disk_cache import file_digest
+
+log = get_logger('mueve')
+
+PATH_NAMES = {'working_folder': working_folder, 'script_directory': script_directory}  # Names the sheet paths may use
 
 def clear_move_directories(move_paths):
     """
@@ -14,59 +29,294 @@ def clear_move_directories(move_paths):
     - move_paths (list): List of unique directory paths to clear.
     """
     for move_path in move_paths:
-        move_path = eval(move_path)  # Convert to path using os.path.join
+        move_path = evaluate_path(move_path, PATH_NAMES)  # Convert to path using os.path.join
         if os.path.exists(move_path):
             for file_name in os.listdir(move_path):
                 file_path = os.path.join(move_path, file_name)
                 try:
                     if os.path.isfile(file_path) or os.path.islink(file_path):
                         os.unlink(file_path)  # Remove file or symlink
-                        print(f"Removed: {file_path}")
+                        log.debug("Removed: %s", file_path)
                     elif os.path.isdir(file_path):
                         shutil.rmtree(file_path)  # Remove directory
-                        print(f"Removed directory: {file_path}")
+                        log.debug("Removed directory: %s", file_path)
                 except Exception as e:
-                    print(f"Failed to remove {file_path}: {e}")
+                    log.error("Failed to remove %s: %s", file_path, e)
         else:
             os.makedirs(move_path)  # Create the directory if it doesn't exist
-            print(f"Created directory: {move_path}")
+            log.info("Created directory: %s", move_path)
 
-def audit_copy(input_data, working_folder):
+def plan_copies(input_data):
     """
-    Audits file presence in the source directory and copies to the specified destination.
-    If a file is missing or data is invalid, it is logged in the missingfiles list.
+    Turns the sheet rows into copy tasks: one per destination file, grouped by
+    destination folder. Repeated rows are copied once; when two rows write the same
+    destination file, the last one wins, as it did when the rows were copied in order.
+
+    Returns:
+        tuple: ({destination_dir: {destination_path: (file_name, source_dir, source_path)}},
+        list of the rows skipped for missing data)
     """
-    missingfiles = []
-    
+    by_destination = {}
+    skipped = []
     for index, row in input_data.iterrows():
         file_name = row['Nombre de archivo']
-        source_dir = eval(row['Source'])  # Convert using os.path.join
-        destination_dir = eval(row['Move'])  # Convert using os.path.join
-        
+
         # Ensure file_name and source_dir are strings
-        if pd.isna(file_name) or pd.isna(source_dir) or pd.isna(destination_dir):
-            print(f"Skipping row {index} due to missing data: {row}")
-            missingfiles.append({'Nombre de archivo': file_name, 'Source': source_dir})
+        if pd.isna(file_name) or pd.isna(row['Source']) or pd.isna(row['Move']):
+            log.warning("Skipping row %s due to missing data: %s", index, row)
+            skipped.append({'Nombre de archivo': file_name, 'Source': row['Source']})
             continue
-        
+
+        source_dir = evaluate_path(row['Source'], PATH_NAMES)  # Convert using os.path.join
+        destination_dir = evaluate_path(row['Move'], PATH_NAMES)  # Convert using os.path.join
         file_name = str(file_name)
-        
         source_path = os.path.join(source_dir, file_name)
         destination_path = os.path.join(destination_dir, file_name)
-        
-        if os.path.exists(source_path):
-            # Create destination directory if it doesn't exist
+
+        tasks = by_destination.setdefault(destination_dir, {})
+        previous = tasks.get(destination_path)
+        if previous is not None and previous[2] != source_path:
+            log.warning("%s is listed from %s and %s; the last row wins.", destination_path, previous[2], source_path)
+        tasks[destination_path] = (file_name, source_dir, source_path)
+    return by_destination, skipped
+
+# Copy strategies: a hard link or a reflink (copy-on-write clone, btrfs/XFS) do not duplicate
+# the bytes when Source and Move are on the same filesystem. Both fall back to a plain copy.
+COPY_STRATEGIES = ('copy', 'reflink', 'hardlink')
+FICLONE = 0x40049409  # Linux ioctl, see ioctl_ficlone(2)
+_unavailable = set()  # (strategy, source folder, destination folder) where the strategy already failed
+
+def _temporary_path(destination_path):
+    return f"{destination_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+def _hardlink(source_path, destination_path):
+    temporary_path = _temporary_path(destination_path)
+    os.link(source_path, temporary_path)
+    os.replace(temporary_path, destination_path)  # Replaces an older copy without writing through it
+
+def _reflink(source_path, destination_path):
+    import fcntl  # Not available on Windows: ImportError falls back to a copy
+    temporary_path = _temporary_path(destination_path)
+    try:
+        with open(source_path, 'rb') as source, open(temporary_path, 'wb') as destination:
+            fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+        shutil.copystat(source_path, temporary_path)
+        os.replace(temporary_path, destination_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+def _copy(source_path, destination_path):
+    temporary_path = _temporary_path(destination_path)
+    try:
+        shutil.copy2(source_path, temporary_path)
+        # Never opens the old file for writing: after a hardlink run it is a source file too
+        os.replace(temporary_path, destination_path)
+    except BaseException:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+_LINKERS = {'hardlink': _hardlink, 'reflink': _reflink}
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.EACCES, errno.EINVAL, errno.ENOTTY, errno.EOPNOTSUPP, errno.EMLINK}
+
+def place_file(source_path, destination_path, strategy='copy'):
+    """
+    Puts source_path at destination_path with the given strategy, or with a plain copy
+    (shutil.copy2) when the filesystem does not support it. Once a strategy fails between
+    two folders it is not tried again for them. Every strategy writes a temporary file and
+    renames it over the destination, so an existing destination is replaced, never written.
+
+    Returns:
+        str: The strategy actually used.
+    """
+    linker = _LINKERS.get(strategy)
+    folders = (strategy, os.path.dirname(source_path), os.path.dirname(destination_path))
+    if linker is not None and folders not in _unavailable:
+        try:
+            linker(source_path, destination_path)
+            return strategy
+        except ImportError:
+            _unavailable.add(folders)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED:
+                raise
+            log.debug("%s not available for %s (%s), copying instead.", strategy, destination_path, e)
+            _unavailable.add(folders)
+    _copy(source_path, destination_path)
+    return 'copy'
+
+def copy_file(source_path, destination_path, strategy='copy'):
+    """
+    Copies one file; returns its status for the summary ('copied', 'missing' or the error)
+    and the strategy used (see place_file).
+    """
+    try:
+        return 'copied', place_file(source_path, destination_path, strategy)
+    except FileNotFoundError:
+        if not os.path.exists(source_path):
+            return 'missing', None
+        raise
+
+MTIME_WINDOW = 2.0  # Seconds; FAT and some SMB shares store modification times with 2 s resolution
+
+def is_same_file(source_path, destination_path, use_hash=False):
+    """Same size and modification time (copy2 keeps it), or same contents with use_hash."""
+    try:
+        destination = os.stat(destination_path)
+    except FileNotFoundError:
+        return False
+    source = os.stat(source_path)
+    if source.st_size != destination.st_size:
+        return False
+    if use_hash:
+        return file_digest(source_path) == file_digest(destination_path)
+    return abs(source.st_mtime - destination.st_mtime) <= MTIME_WINDOW
+
+def sync_file(source_path, destination_path, use_hash=False, dry_run=False, strategy='copy'):
+    """
+    Copies one file only when the destination is missing or different ('copied',
+    'unchanged' or 'missing'), and returns the strategy used (see place_file).
+    """
+    if not os.path.exists(source_path):
+        if os.path.lexists(destination_path) and not dry_run:
+            os.unlink(destination_path)  # As after a wipe: no stale copy of a file that is gone
+        return 'missing', None
+    if is_same_file(source_path, destination_path, use_hash):
+        return 'unchanged', None
+    if dry_run:
+        return 'copied', strategy
+    return 'copied', place_file(source_path, destination_path, strategy)
+
+def _prune_key(path):
+    # Windows and macOS volumes are usually case-insensitive: 'Carta.pdf' in the sheet is the
+    # 'carta.pdf' on disk. Ignoring case everywhere can only keep a file, never delete one
+    return os.path.normcase(os.path.normpath(path)).casefold()
+
+def prune_move_directories(by_destination, dry_run=False):
+    """
+    Sync counterpart of clear_move_directories: deletes only what the sheet no longer lists
+    in the Move folders (files and folders). Folders that lead to a listed file or to
+    another Move folder are kept. Paths are compared ignoring case.
+
+    Returns:
+        list: The deleted paths (the ones that would be deleted with dry_run).
+    """
+    keep = set()
+    for destination_dir, tasks in by_destination.items():
+        for path in [destination_dir, *tasks]:
+            path = _prune_key(path)
+            while path not in keep and os.path.dirname(path) != path:
+                keep.add(path)
+                path = os.path.dirname(path)
+
+    deleted = []
+    for destination_dir in by_destination:
+        if not os.path.isdir(destination_dir):
+            continue
+        with os.scandir(destination_dir) as entries:
+            for entry in entries:
+                if _prune_key(entry.path) in keep:
+                    continue
+                deleted.append(entry.path)
+                if dry_run:
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        shutil.rmtree(entry.path)  # Remove directory
+                    else:
+                        os.unlink(entry.path)  # Remove file or symlink
+                except Exception as e:
+                    log.error("Failed to remove %s: %s", entry.path, e)
+    return deleted
+
+DEFAULT_COPY_WORKERS = 8
+
+def audit_copy(input_data, working_folder, workers=DEFAULT_COPY_WORKERS, sync=False, use_hash=False, dry_run=False,
+               strategy='copy'):
+    """
+    Audits file presence in the source directory and copies to the specified destination.
+    If a file is missing or data is invalid, it is logged in the missingfiles list.
+    Each destination folder is created once and the copies run in a pool of `workers`
+    threads (on a network share the time goes in per-file latency, not in the CPU). The
+    status of every file is reported in one summary at the end.
+
+    With sync, only new or changed files are copied (see is_same_file) and the files the
+    sheet no longer lists are deleted (see prune_move_directories); dry_run only reports
+    what sync would do. strategy is one of COPY_STRATEGIES; the one actually used for
+    every file is in the summary.
+    """
+    by_destination, missingfiles = plan_copies(input_data)
+    if not dry_run:
+        for destination_dir in by_destination:
             os.makedirs(destination_dir, exist_ok=True)
-            # Copy file
-            shutil.copy2(source_path, destination_path)
-            print(f"{file_name} from {source_dir} was copied to {destination_dir}")
+
+    tasks = [(destination_path, *task) for tasks in by_destination.values() for destination_path, task in tasks.items()]
+    repeated_rows = len(input_data) - len(missingfiles) - len(tasks)
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        if sync:
+            futures = [executor.submit(sync_file, source_path, destination_path, use_hash, dry_run, strategy)
+                       for destination_path, _, _, source_path in tasks]
         else:
-            print(f"File not found: {source_path}")
+            futures = [executor.submit(copy_file, source_path, destination_path, strategy)
+                       for destination_path, _, _, source_path in tasks]
+
+    statuses = collections.Counter()
+    strategies = collections.Counter()
+    report = []
+    for (destination_path, file_name, source_dir, source_path), future in zip(tasks, futures):
+        try:
+            status, used = future.result()
+        except Exception as e:
+            status, used = f"error: {e}", None
+        statuses['error' if status.startswith('error') else status] += 1
+        if used:
+            strategies[used] += 1
+        report.append(f"{status}{f' ({used})' if used else ''}: {source_path} -> {destination_path}")
+        if status not in ('copied', 'unchanged'):
             missingfiles.append({'Nombre de archivo': file_name, 'Source': source_dir})
-    
+
+    if sync:
+        deleted = prune_move_directories(by_destination, dry_run)
+        report.extend(f"deleted: {path}" for path in deleted)
+        log.info("%sSync: %s file(s) copied, %s unchanged, %s deleted in %s folder(s), %s missing, %s failed.",
+                 "[dry run] " if dry_run else "", statuses['copied'], statuses['unchanged'], len(deleted),
+                 len(by_destination), statuses['missing'], statuses['error'])
+    else:
+        log.info("%s file(s) copied to %s folder(s), %s missing, %s failed (%s rows with a repeated destination skipped).",
+                 statuses['copied'], len(by_destination), statuses['missing'], statuses['error'], repeated_rows)
+    if strategies:
+        log.info("Strategy used: %s", ", ".join(f"{count} {used}" for used, count in strategies.most_common()))
+    if dry_run:
+        log.info("Changes that sync would make:\n%s", "\n".join(line for line in report if not line.startswith('unchanged')) or "(none)")
+    log.debug("Copy status per file:\n%s", "\n".join(report))
+    for line in report:
+        if line.startswith('error'):
+            log.error("%s", line)
     return missingfiles
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Copia los archivos de la hoja 'Parametrización' de Cartas.xlsx a sus carpetas Move.")
+    parser.add_argument('--copy-workers', type=int, default=DEFAULT_COPY_WORKERS,
+                        help="Files copied at the same time (default: %(default)s).")
+    parser.add_argument('--sync', action='store_true',
+                        help="Instead of emptying the Move folders, copy only new or changed files and delete the ones no longer listed.")
+    parser.add_argument('--hash', action='store_true', help="With --sync, compare the files by content (SHA-256) instead of size and date.")
+    parser.add_argument('--dry-run', action='store_true', help="With --sync, only report what would be copied and deleted.")
+    parser.add_argument('--copy-strategy', choices=COPY_STRATEGIES, default='copy',
+                        help="reflink (copy-on-write clone) or hardlink avoid duplicating the bytes on the same filesystem; "
+                             "both fall back to a copy (default: %(default)s). A hard link shares the file: edits show in both places.")
+    add_logging_arguments(parser)
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    configure_from_args(args)
+    if (args.dry_run or args.hash) and not args.sync:
+        log.error("--dry-run and --hash only apply to --sync.")
+        return
+
     # Define the working folder
     #working_folder = r'YOUR_WORKING_DIRECTORY'  # Replace with the actual working directory
 
@@ -87,22 +337,29 @@ def main():
         input_data = input_data[(input_data['Nombre de archivo'].str.strip() != '') & 
                                 (input_data['Source'].str.strip() != '') & 
                                 (input_data['Move'].str.strip() != '')]
-        
-        # Clear previous files in 'Move' directories
-        unique_moves = input_data['Move'].dropna().unique()
-        clear_move_directories(unique_moves)
-        
+
+        # Validate every path expression before touching any folder
+        errors = validate_expressions(pd.concat([input_data['Source'], input_data['Move']]).unique(), PATH_NAMES)
+        if errors:
+            log.error("Invalid paths in the 'Parametrización' sheet:\n%s", "\n".join(
+                f"- {expression}: {error}" for expression, error in errors.items()))
+            return
+
+        # Clear previous files in 'Move' directories (sync deletes only the files no longer listed)
+        if not args.sync:
+            unique_moves = input_data['Move'].dropna().unique()
+            clear_move_directories(unique_moves)
+
         # Audit and copy files
-        missingfiles = audit_copy(input_data, working_folder)
+        missingfiles = audit_copy(input_data, working_folder, workers=args.copy_workers,
+                                  sync=args.sync, use_hash=args.hash, dry_run=args.dry_run, strategy=args.copy_strategy)
         if missingfiles:
-            print("\nMissing files:")
-            for item in missingfiles:
-                #print(f"File: {item['Nombre de archi vo']} from: {item['Source']}")
-                print(f"File: {item['Nombre de archivo']} from: /{os.path.basename(os.path.normpath(item['Source']))}")
-        else: 
-            print("\n*************\nSuccess! \n*************\n") 
+            log.warning("Missing files:\n%s", "\n".join(
+                f"File: {item['Nombre de archivo']} from: /{os.path.basename(os.path.normpath(item['Source']))}" for item in missingfiles))
+        else:
+            log.info("Success!")
     else:
-        print("The required columns ['Nombre de archivo', 'Source', 'Move'] are missing in the input data.")
+        log.error("The required columns ['Nombre de archivo', 'Source', 'Move'] are missing in the input data.")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
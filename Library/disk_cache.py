@@ -0,0 +1,142 @@
+"""
+Small on-disk text cache for expensive extraction steps.
+
+Entries are files named after a key (see make_key) inside one cache folder. Reading an
+entry refreshes its modification time, so evicting the oldest files first is an LRU
+policy. Writes go through a temporary file and os.replace, which lets several worker
+processes share the same folder. A folder that cannot be read behaves as an empty cache;
+write errors are raised, so the caller decides whether to go on without the cache.
+"""
+import contextlib
+import hashlib
+import os
+import tempfile
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+ENTRY_SUFFIX = '.txt'
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """SHA-256 of the file contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """Cache key from the content hash plus everything that changes the result (extractor, version, ...)."""
+    return hashlib.sha256('\0'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def _entry_path(cache_dir, key):
+    return os.path.join(cache_dir, key + ENTRY_SUFFIX)
+
+
+def cache_lookup(cache_dir, key):
+    """Path of the entry, marked as recently used, or None when it is not cached."""
+    path = _entry_path(cache_dir, key)
+    try:
+        os.utime(path)
+    except OSError:  # Missing entry, or a folder that is not there / not accessible
+        return None
+    return path
+
+
+def open_entry(cache_dir):
+    """
+    Starts a new entry: returns (text file, temporary path). Finish it with commit_entry,
+    or drop it with discard_entry.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    return os.fdopen(fd, 'w', encoding='utf-8'), tmp_path
+
+
+def commit_entry(cache_dir, key, entry, max_bytes=DEFAULT_MAX_BYTES):
+    """Stores an entry from open_entry under key, then evicts above max_bytes. On error the entry is discarded."""
+    file, tmp_path = entry
+    try:
+        file.close()
+        os.replace(tmp_path, _entry_path(cache_dir, key))
+    except BaseException:
+        discard_entry(entry)
+        raise
+    evict(cache_dir, max_bytes)
+
+
+def discard_entry(entry):
+    """Drops an entry from open_entry. Never raises."""
+    file, tmp_path = entry
+    try:
+        file.close()
+    except OSError:
+        pass
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+
+@contextlib.contextmanager
+def cache_writer(cache_dir, key, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Text file to fill incrementally. The entry is stored only if the with block finishes
+    normally; an exception or an abandoned generator (GeneratorExit) discards it.
+    """
+    entry = open_entry(cache_dir)
+    try:
+        yield entry[0]
+    except BaseException:
+        discard_entry(entry)
+        raise
+    commit_entry(cache_dir, key, entry, max_bytes)
+
+
+def cache_get(cache_dir, key):
+    """Returns the cached text or None, and marks the entry as recently used."""
+    path = cache_lookup(cache_dir, key)
+    if path is None:
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return file.read()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def cache_put(cache_dir, key, text, max_bytes=DEFAULT_MAX_BYTES):
+    """Stores the text under key and evicts the least recently used entries above max_bytes."""
+    with cache_writer(cache_dir, key, max_bytes) as file:
+        file.write(text)
+
+
+def evict(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """Deletes the oldest entries until the folder holds at most max_bytes. Returns the number removed."""
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as scan:
+        for entry in scan:
+            if not entry.name.endswith(ENTRY_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:  # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:  # Removed by another process
+            pass
+        except OSError:  # In use (Windows) or read-only: it stays, try the next one
+            continue
+        total -= size
+    return removed
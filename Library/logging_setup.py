@@ -0,0 +1,96 @@
+"""
+Shared logging for the licitaciones scripts.
+
+Every script asks for its own logger (get_logger('cartas'), get_logger('requisitos'), ...)
+so the level can be changed per module from the command line:
+
+    python "00 Extrae requisitos.py" --quiet --log-level requisitos=DEBUG
+
+or through the LICITACIONES_LOG_LEVELS environment variable ("cartas=DEBUG,split=WARNING").
+Messages use %-style arguments (log.debug("Row %s", row)) so nothing is formatted when the
+level is disabled.
+"""
+import logging
+import os
+import sys
+
+ROOT_LOGGER = 'licitaciones'
+LOG_FORMAT = '[%(levelname)s] %(message)s'
+ENV_LEVELS = 'LICITACIONES_LOG_LEVELS'
+
+_current_config = (False, False, ())
+
+
+def get_logger(name):
+    """Returns the logger of one script/module, e.g. get_logger('hybrids')."""
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def add_logging_arguments(parser):
+    """Adds --quiet, --verbose and --log-level to an argparse parser."""
+    group = parser.add_argument_group('logging')
+    verbosity = group.add_mutually_exclusive_group()
+    verbosity.add_argument('-q', '--quiet', action='store_true', help="Only show warnings and errors.")
+    verbosity.add_argument('-v', '--verbose', action='store_true', help="Show debug messages.")
+    group.add_argument('--log-level', action='append', default=[], metavar='MODULE=LEVEL',
+                       help="Level for one module, e.g. cartas=DEBUG. Can be repeated or comma separated.")
+    return parser
+
+
+def parse_module_levels(specs):
+    """
+    Parses ["cartas=DEBUG", "split=warning,hybrids=INFO"] into {'cartas': 10, 'split': 30, 'hybrids': 20}.
+    """
+    levels = {}
+    for spec in specs:
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            name, separator, level_name = item.partition('=')
+            level = logging.getLevelName(level_name.strip().upper())
+            if not separator or not name.strip() or not isinstance(level, int):
+                raise ValueError(f"Invalid log level '{item}', expected MODULE=LEVEL (e.g. cartas=DEBUG).")
+            levels[name.strip()] = level
+    return levels
+
+
+def configure_logging(quiet=False, verbose=False, module_levels=()):
+    """
+    Sets the global level (WARNING with quiet, DEBUG with verbose, INFO otherwise) and the
+    per-module levels from LICITACIONES_LOG_LEVELS and `module_levels`. Safe to call again,
+    e.g. from the initializer of a worker process.
+    """
+    global _current_config
+    _current_config = (quiet, verbose, tuple(module_levels))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        root.addHandler(handler)
+        root.propagate = False
+
+    if quiet:
+        root.setLevel(logging.WARNING)
+    elif verbose:
+        root.setLevel(logging.DEBUG)
+    else:
+        root.setLevel(logging.INFO)
+
+    specs = [os.environ.get(ENV_LEVELS, '')] + list(module_levels)
+    for name, level in parse_module_levels(specs).items():
+        get_logger(name).setLevel(level)
+
+
+def current_logging_config():
+    """
+    Arguments of the last configure_logging() call, to replay it in worker processes:
+    ProcessPoolExecutor(initializer=configure_logging, initargs=current_logging_config()).
+    """
+    return _current_config
+
+
+def configure_from_args(args):
+    """configure_logging() from the namespace returned by a parser with add_logging_arguments."""
+    configure_logging(quiet=args.quiet, verbose=args.verbose, module_levels=args.log_level)
@@ -0,0 +1,80 @@
+"""
+Safe evaluation of the path expressions stored in Cartas.xlsx, such as
+
+    os.path.join(working_folder, 'Propuesta', 'Legal')
+
+Only os.path.join (nested or not), string literals and the names passed by the script
+(working_folder, script_directory, ...) are accepted, so a cell can never run code.
+A cell is an expression when it uses os.path.join or one of those names, or is a quoted
+string; anything else in it (working_folder + '/Legal', ...) is an error. Every other cell
+(Acta.pdf, Legal/Acta.pdf, C:\\Propuesta\\Legal) is a plain path. Results are memoized per
+distinct expression: a sheet with thousands of rows usually has a few dozen.
+"""
+import ast
+import functools
+import os
+
+
+def _evaluate_node(node, names):
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise ValueError(f"unknown name '{node.id}' (allowed: {', '.join(sorted(names))})")
+        return names[node.id]
+    if isinstance(node, ast.Call) and ast.unparse(node.func) == 'os.path.join':
+        if node.keywords or not node.args:
+            raise ValueError("os.path.join only takes positional arguments")
+        return os.path.join(*(_evaluate_node(arg, names) for arg in node.args))
+    raise ValueError(f"'{ast.unparse(node)}' is not allowed, only os.path.join, strings and {', '.join(sorted(names))}")
+
+
+@functools.lru_cache(maxsize=4096)
+def _evaluate(expression, names):
+    text = expression.strip()
+    names = dict(names)
+    quoted = text[:1] in ('"', "'") or text[-1:] in ('"', "'")
+    try:
+        tree = ast.parse(text, mode='eval')
+    except SyntaxError as e:
+        # A broken expression is an error, not a path
+        if 'os.path.join' in text or quoted:
+            raise ValueError(f"invalid expression: {e.msg}") from None
+        return expression
+    uses_names = any(isinstance(node, ast.Name) and node.id in names for node in ast.walk(tree))
+    if 'os.path.join' in text or uses_names or quoted:
+        return _evaluate_node(tree.body, names)
+    return expression  # Acta.pdf or Legal/Acta.pdf parse as Python too, but are plain paths
+
+
+def evaluate_path(expression, names):
+    """
+    Path of one sheet cell.
+
+    Args:
+        expression (str): e.g. "os.path.join(working_folder, 'Legal')" or a plain path.
+        names (dict): Variables the expressions may use, e.g. {'working_folder': ...}.
+
+    Returns:
+        str: The path.
+
+    Raises:
+        ValueError: When the expression uses anything else.
+    """
+    return _evaluate(str(expression), tuple(sorted(names.items())))
+
+
+def validate_expressions(expressions, names):
+    """
+    Checks every distinct expression of a sheet before anything is touched.
+
+    Returns:
+        dict: {expression: error message} for the invalid ones (empty when all are valid).
+    """
+    errors = {}
+    for expression in dict.fromkeys(str(expression) for expression in expressions):
+        try:
+            evaluate_path(expression, names)
+        except ValueError as e:
+            errors[expression] = str(e)
+    return errors
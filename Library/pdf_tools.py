@@ -0,0 +1,98 @@
+"""
+PyPDF2 helpers shared by the split and merge scripts.
+"""
+from PyPDF2.generic import ArrayObject, DictionaryObject, IndirectObject, NullObject, StreamObject
+
+# Dictionaries that are safe to merge when two of them are identical. Pages and the page
+# tree are never merged: a page must appear only once in /Kids.
+SHAREABLE_TYPES = {'/Font', '/FontDescriptor', '/XObject', '/ExtGState', '/Encoding', '/Pattern', '/Shading'}
+
+
+def _is_shareable(obj):
+    if isinstance(obj, StreamObject):
+        return obj.get('/Type') not in ('/Metadata',)
+    return isinstance(obj, DictionaryObject) and obj.get('/Type') in SHAREABLE_TYPES
+
+
+def _replace_references(obj, replacements, writer):
+    """Points every reference in obj (recursively, not through other indirect objects) to the kept copy."""
+    if isinstance(obj, DictionaryObject):
+        items = obj.items()
+    elif isinstance(obj, ArrayObject):
+        items = enumerate(obj)
+    else:
+        return
+    for key, value in list(items):
+        if isinstance(value, IndirectObject):
+            if value.pdf is writer and value.idnum in replacements:
+                obj[key] = IndirectObject(replacements[value.idnum], 0, writer)
+        else:
+            _replace_references(value, replacements, writer)
+
+
+def dedupe_identical_objects(writer, max_passes=4):
+    """
+    Merges identical streams (fonts, images, forms) and resource dictionaries of a
+    PdfWriter, so each one is written once per output file. PyPDF2 already shares the
+    objects that come from the same source object; this also catches the copies that
+    come from different sources, e.g. the same logo embedded in every merged letter.
+    Call it once all pages were added, right before writing.
+
+    Returns:
+        int: number of objects removed.
+    """
+    removed = 0
+    for _ in range(max_passes):  # A font dictionary is identical only once its font file was merged
+        kept = {}
+        replacements = {}
+        for index, obj in enumerate(writer._objects):
+            if obj is None or not _is_shareable(obj):
+                continue
+            digest = obj.hash_value()
+            if digest in kept:
+                replacements[index + 1] = kept[digest]
+            else:
+                kept[digest] = index + 1
+        if not replacements:
+            break
+        for index, obj in enumerate(writer._objects):
+            if obj is not None and index + 1 not in replacements:
+                _replace_references(obj, replacements, writer)
+        for idnum in replacements:
+            # Keep the slot: PyPDF2 numbers the xref entries by position
+            writer._objects[idnum - 1] = NullObject()
+        removed += len(replacements)
+    return removed
+
+
+def page_index_map(reader):
+    """{page object number: page index}, built once so outline lookups do not scan the page list."""
+    return {page.indirect_reference.idnum: index for index, page in enumerate(reader.pages)
+            if page.indirect_reference is not None}
+
+
+def iter_outline(outline, depth=1, level=1):
+    """
+    Yields (level, destination) for the outline entries down to `depth` levels (None =
+    all), parents before their children. PyPDF2 returns the children of an entry as a
+    list right after it.
+    """
+    for entry in outline:
+        if isinstance(entry, list):
+            if depth is None or level < depth:
+                yield from iter_outline(entry, depth, level + 1)
+        else:
+            yield level, entry
+
+
+def destination_page_index(reader, destination, index_map=None):
+    """Page index of an outline entry or named destination, None when it cannot be resolved."""
+    page = destination.get('/Page') if hasattr(destination, 'get') else None
+    if isinstance(page, IndirectObject) and index_map is not None and page.idnum in index_map:
+        return index_map[page.idnum]
+    if isinstance(page, int):  # Destinations pointing into another document use page numbers
+        return page
+    try:
+        return reader.get_destination_page_number(destination)
+    except Exception:
+        return None
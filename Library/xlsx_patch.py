@@ -0,0 +1,367 @@
+"""
+Writes a few cell values into an existing .xlsx without loading it in openpyxl.
+
+Only the <c> elements of the written cells are replaced in the sheet XML; every other part
+of the file (styles, validations, other cells, other sheets) is copied unchanged. Text goes
+to the shared strings table, reusing the entry when the text is already there. Layouts
+this module does not handle raise ValueError before anything is written, so the caller
+can fall back to openpyxl.
+"""
+import codecs
+import collections
+import numbers
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+PACKAGE_RELATIONSHIP = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+
+_ROW = re.compile(r'<row\b([^>]*?)(/?)>')
+_CELL = re.compile(r'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.DOTALL)
+_CELL_REFERENCE = re.compile(r'\br="([A-Z]+)(\d+)"')
+_ROW_NUMBER = re.compile(r'\br="(\d+)"')
+_STYLE = re.compile(r'\bs="(\d+)"')
+_TYPE = re.compile(r'\bt="(\w+)"')
+_SPANS = re.compile(r'\bspans="(\d+):(\d+)"')
+_DIMENSION = re.compile(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"\s*/>')
+_ILLEGAL_CHARACTERS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+CHUNK_SIZE = 1024 * 1024
+
+
+def _relationships(archive, part):
+    """{relationship id: (type, target part)} of a package part ('' is the package itself)."""
+    folder, name = posixpath.split(part)
+    try:
+        root = ET.fromstring(archive.read(posixpath.join(folder, '_rels', name + '.rels')))
+    except KeyError:
+        return {}
+    relationships = {}
+    for relationship in root.iter(PACKAGE_RELATIONSHIP):
+        target = relationship.get('Target')
+        target = target[1:] if target.startswith('/') else posixpath.normpath(posixpath.join(folder, target))
+        relationships[relationship.get('Id')] = (relationship.get('Type'), target)
+    return relationships
+
+
+def _workbook_parts(archive):
+    """(workbook part, active sheet part, shared strings part or None), the sheet openpyxl calls active."""
+    workbook_part = next(target for kind, target in _relationships(archive, '').values() if kind.endswith('/officeDocument'))
+    root = ET.fromstring(archive.read(workbook_part))
+    view = root.find(f'{MAIN_NS}bookViews/{MAIN_NS}workbookView')
+    active = int(view.get('activeTab', 0)) if view is not None else 0
+    sheet_id = root.findall(f'{MAIN_NS}sheets/{MAIN_NS}sheet')[active].get(RELATIONSHIP_ID)
+    relationships = _relationships(archive, workbook_part)
+    strings_part = next((target for kind, target in relationships.values() if kind.endswith('/sharedStrings')), None)
+    return workbook_part, relationships[sheet_id][1], strings_part
+
+
+def _read_shared_strings(source):
+    """(number of entries, {plain text: index}) of a shared strings part; rich text entries are never reused."""
+    indexes = {}
+    count = 0
+    for _, element in ET.iterparse(source):
+        if element.tag == f'{MAIN_NS}si':
+            text = element.find(f'{MAIN_NS}t')
+            if text is not None and element.find(f'{MAIN_NS}r') is None:
+                indexes.setdefault(text.text or '', count)
+            count += 1
+            element.clear()
+    return count, indexes
+
+
+class _SharedStrings:
+    def __init__(self, count, indexes):
+        self.count = count
+        self.indexes = indexes
+        self.added = []
+        self.references = 0  # Change in the number of cells that point to the table
+
+    def index(self, text):
+        if text not in self.indexes:
+            self.indexes[text] = self.count + len(self.added)
+            self.added.append(text)
+        return self.indexes[text]
+
+
+def _cell_xml(reference, style, value, strings):
+    attributes = f' r="{reference}"' + (f' s="{style}"' if style else '')
+    if value is None:
+        return f'<c{attributes}/>'
+    if isinstance(value, bool):
+        return f'<c{attributes} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Integral):
+        return f'<c{attributes}><v>{int(value)}</v></c>'
+    if isinstance(value, numbers.Real):
+        value = float(value)
+        if value != value or value in (float('inf'), float('-inf')):
+            raise ValueError(f"{reference}: {value} cannot be stored in a cell")
+        return f'<c{attributes}><v>{value!r}</v></c>'
+    if isinstance(value, str):
+        if _ILLEGAL_CHARACTERS.search(value):
+            raise ValueError(f"{reference}: control characters in the text")
+        if strings is None:
+            return f'<c{attributes} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+        strings.references += 1
+        return f'<c{attributes} t="s"><v>{strings.index(value)}</v></c>'
+    raise ValueError(f"{reference}: {type(value).__name__} values are not supported")
+
+
+def _patch_row(attributes, inner, row_number, values, strings):
+    """(row start tag attributes, row contents, True if a formula was overwritten)."""
+    pending = sorted(values)
+    pieces, position, last_column, cells_end = [], 0, 0, 0
+    formula_removed = False
+
+    def new_cells(limit):
+        while pending and pending[0] < limit:
+            column = pending.pop(0)
+            pieces.append(_cell_xml(f"{get_column_letter(column)}{row_number}", None, values[column], strings))
+
+    for match in _CELL.finditer(inner):
+        reference = _CELL_REFERENCE.search(match.group(1))
+        if reference is None or int(reference.group(2)) != row_number:
+            raise ValueError(f"row {row_number}: cell without a reference to its row")
+        column = column_index_from_string(reference.group(1))
+        if column <= last_column:
+            raise ValueError(f"row {row_number}: cells out of order")
+        last_column, cells_end = column, match.end()
+        pieces.append(inner[position:match.start()])
+        position = match.start()
+        new_cells(column)
+        if not pending or pending[0] != column:
+            continue
+        pending.pop(0)
+        cell_reference = f"{reference.group(1)}{row_number}"
+        body = match.group(2) or ''
+        if '<f' in body:
+            formula = body[body.index('<f'):body.index('>', body.index('<f'))]
+            if 't="array"' in formula or 't="dataTable"' in formula or ('t="shared"' in formula and 'ref="' in formula):
+                # Other cells depend on this element
+                raise ValueError(f"{cell_reference}: array, data table or shared formula")
+            formula_removed = True
+        cell_type = _TYPE.search(match.group(1))
+        if strings is not None and cell_type and cell_type.group(1) == 's':
+            strings.references -= 1
+        style = _STYLE.search(match.group(1))
+        pieces.append(_cell_xml(cell_reference, style and style.group(1), values[column], strings))
+        position = match.end()
+    # The other new cells go right after the last cell (before an <extLst>, if any)
+    pieces.append(inner[position:cells_end])
+    new_cells(float('inf'))
+    pieces.append(inner[max(position, cells_end):])
+
+    spans = _SPANS.search(attributes)
+    if spans and values:
+        first, last = min(int(spans.group(1)), min(values)), max(int(spans.group(2)), max(values))
+        attributes = attributes[:spans.start()] + f'spans="{first}:{last}"' + attributes[spans.end():]
+    return attributes, ''.join(pieces), formula_removed
+
+
+def _iter_row_blocks(source, chunk_size=CHUNK_SIZE):
+    """Text of a sheet part in blocks of about chunk_size that only end right before a <row."""
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in iter(lambda: source.read(chunk_size), b''):
+        pending += decoder.decode(chunk)
+        split = pending.rfind('<row')
+        if split > 0:
+            yield pending[:split]
+            pending = pending[split:]
+    yield pending + decoder.decode(b'', final=True)
+
+
+def _dimension(match, rows):
+    """<dimension> that also covers the written cells (openpyxl's read-only mode trusts it)."""
+    first_column, first_row = column_index_from_string(match.group(1)), int(match.group(2))
+    last_column = column_index_from_string(match.group(3)) if match.group(3) else first_column
+    last_row = int(match.group(4)) if match.group(4) else first_row
+    columns = {column for values in rows.values() for column in values}
+    return (f'<dimension ref="{get_column_letter(min(first_column, *columns))}{min(first_row, *rows)}:'
+            f'{get_column_letter(max(last_column, *columns))}{max(last_row, *rows)}"/>')
+
+
+def _patch_sheet(source, target, rows, strings):
+    """
+    Copies the sheet XML from source to target (binary files) with the cells written, one
+    block of whole rows at a time, so memory does not grow with the sheet.
+
+    Returns:
+        bool: True if a formula was overwritten.
+    """
+    rows = {row: values for row, values in rows.items() if values}
+    pending = collections.deque(sorted(rows))
+    formula_removed = False
+    sheet_data = dimension_done = False
+
+    def new_rows(limit, pieces):
+        while pending and pending[0] < limit:
+            row = pending.popleft()
+            pieces.append(f'<row r="{row}">{_patch_row("", "", row, rows[row], strings)[1]}</row>')
+
+    for block in _iter_row_blocks(source):
+        if not dimension_done and rows:
+            dimension = _DIMENSION.search(block)
+            if dimension:
+                block = block[:dimension.start()] + _dimension(dimension, rows) + block[dimension.end():]
+                dimension_done = True
+        sheet_data = sheet_data or '<sheetData' in block
+        pieces, position = [], 0
+        for match in _ROW.finditer(block):
+            if not pending:
+                break
+            row = _ROW_NUMBER.search(match.group(1))
+            if row is None:
+                raise ValueError("row without a number")
+            row = int(row.group(1))
+            pieces.append(block[position:match.start()])
+            position = match.start()
+            new_rows(row, pieces)
+            if not pending or pending[0] != row:
+                continue
+            pending.popleft()
+            if match.group(2):  # <row .../>
+                inner, position = '', match.end()
+            else:
+                close = block.index('</row>', match.end())
+                inner, position = block[match.end():close], close + len('</row>')
+            attributes, inner, removed = _patch_row(match.group(1), inner, row, rows[row], strings)
+            formula_removed |= removed
+            pieces.append(f'<row{attributes}>{inner}</row>')
+
+        # The rows after the last one go at the end of <sheetData>
+        rest = block[position:]
+        empty = re.search(r'<sheetData\s*/>', rest)
+        end = rest.find('</sheetData>')
+        if pending and (empty or end >= 0):
+            if empty:
+                pieces.append(rest[:empty.start()] + '<sheetData>')
+                rest = '</sheetData>' + rest[empty.end():]
+            else:
+                pieces.append(rest[:end])
+                rest = rest[end:]
+            new_rows(float('inf'), pieces)
+        pieces.append(rest)
+        target.write(''.join(pieces).encode('utf-8'))
+
+    if not sheet_data:
+        raise ValueError("no <sheetData> (namespace prefix?)")
+    return formula_removed
+
+
+def _add_shared_strings(xml, strings):
+    if not xml.rstrip().endswith('</sst>'):
+        raise ValueError("unexpected shared strings table")
+    added = ''.join(f'<si><t xml:space="preserve">{escape(text)}</t></si>' for text in strings.added)
+    end = xml.rindex('</sst>')
+    xml = xml[:end] + added + xml[end:]
+    start_tag = xml[:xml.index('>', xml.index('<sst')) + 1]
+    counted = re.sub(r'\buniqueCount="\d+"', f'uniqueCount="{strings.count + len(strings.added)}"', start_tag, count=1)
+    counted = re.sub(r'\bcount="(\d+)"', lambda match: f'count="{max(0, int(match.group(1)) + strings.references)}"', counted, count=1)
+    return counted + xml[len(start_tag):]
+
+
+def _recalculate_on_load(xml):
+    """Excel recomputes every formula when it opens the file, as in files saved by openpyxl."""
+    match = re.search(r'<calcPr\b([^>]*?)(/?)>', xml)
+    if match:
+        attributes = re.sub(r'\s+fullCalcOnLoad="\w+"', '', match.group(1))
+        return xml[:match.start()] + f'<calcPr{attributes} fullCalcOnLoad="1"{match.group(2)}>' + xml[match.end():]
+    # calcPr goes after definedNames, before the optional elements that follow it
+    following = re.search(r'<(oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing|fileRecoveryPr|'
+                          r'webPublishObjects|extLst)\b|</workbook>', xml)
+    if following is None:
+        raise ValueError("unexpected workbook part")
+    return xml[:following.start()] + '<calcPr fullCalcOnLoad="1"/>' + xml[following.start():]
+
+
+def _without_calculation_chain(archive, workbook_part, replacements):
+    """
+    Drops the calculation chain: it lists the formula cells, and Excel reports the file as
+    damaged when one of them no longer has a formula. Excel rebuilds it on load.
+
+    Returns:
+        set: The dropped part (empty when there is none).
+    """
+    relationships = _relationships(archive, workbook_part)
+    chain = next((target for kind, target in relationships.values() if kind.endswith('/calcChain')), None)
+    if chain is None:
+        return set()
+    folder, name = posixpath.split(workbook_part)
+    rels_part = posixpath.join(folder, '_rels', name + '.rels')
+    rels = archive.read(rels_part).decode('utf-8')
+    replacements[rels_part] = re.sub(r'<Relationship\b[^>]*?/calcChain"[^>]*?/>', '', rels).encode('utf-8')
+    types = archive.read('[Content_Types].xml').decode('utf-8')
+    replacements['[Content_Types].xml'] = re.sub(rf'<Override\b[^>]*?PartName="/{re.escape(chain)}"[^>]*?/>', '', types).encode('utf-8')
+    return {chain}
+
+
+def _entry_info(item):
+    info = zipfile.ZipInfo(item.filename, item.date_time)
+    info.compress_type = item.compress_type
+    info.external_attr = item.external_attr
+    return info
+
+
+def write_cells(input_xlsx, output_path, rows):
+    """
+    Copies input_xlsx to output_path with new values in the active sheet. The sheet is
+    streamed, so memory depends on the number of written cells, not on the sheet size.
+
+    Args:
+        input_xlsx (str): Template to copy.
+        output_path (str): File to write.
+        rows (dict): {row: {column: value}}, 1-based; str, int, float, bool or None.
+
+    Raises:
+        ValueError: When the file uses something this module does not patch (namespace
+            prefixes, an array or shared formula on a written cell, ...). Nothing is
+            written then.
+    """
+    with zipfile.ZipFile(input_xlsx) as archive, tempfile.TemporaryFile() as sheet_file:
+        try:
+            workbook_part, sheet_part, strings_part = _workbook_parts(archive)
+            strings = None
+            if strings_part:
+                with archive.open(strings_part) as source:
+                    strings = _SharedStrings(*_read_shared_strings(source))
+            with archive.open(sheet_part) as source:
+                formula_removed = _patch_sheet(source, sheet_file, rows, strings)
+        except (KeyError, IndexError, StopIteration, UnicodeDecodeError, ET.ParseError) as e:
+            raise ValueError(f"unexpected workbook structure: {e}") from None
+
+        replacements = {workbook_part: _recalculate_on_load(archive.read(workbook_part).decode('utf-8')).encode('utf-8')}
+        if strings is not None and (strings.added or strings.references):
+            replacements[strings_part] = _add_shared_strings(archive.read(strings_part).decode('utf-8'), strings).encode('utf-8')
+        dropped = _without_calculation_chain(archive, workbook_part, replacements) if formula_removed else set()
+
+        # Same entries in the same order; written next to the output and renamed when complete
+        temporary_path = f"{output_path}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(temporary_path, 'w', zipfile.ZIP_DEFLATED) as output:
+                for item in archive.infolist():
+                    if item.filename in dropped:
+                        continue
+                    if item.filename in replacements:
+                        output.writestr(_entry_info(item), replacements[item.filename])
+                        continue
+                    with output.open(_entry_info(item), 'w') as target:
+                        if item.filename == sheet_part:
+                            sheet_file.seek(0)
+                            shutil.copyfileobj(sheet_file, target)
+                        else:
+                            with archive.open(item) as source:
+                                shutil.copyfileobj(source, target)
+            os.replace(temporary_path, output_path)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.remove(temporary_path)
+            raise